@@ -0,0 +1,331 @@
+#!python3
+#
+# Copyright (C) 2014-2015 Julius Susanto. All rights reserved.
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file.
+
+"""
+PYPOWER-Dynamics
+Accuracy Harness
+Compares engine configurations (integrator, step size, network tolerances, ...) against golden
+trajectories and critical clearing times (CCTs) of a fixed set of case39 branch faults
+
+The golden file is produced by the runge_kutta integrator with a small step size. Every fault is
+simulated with the fault cleared at a fixed clearing time (trajectory), and its CCT is found by
+bisection of the clearing time in time steps (as in sample.criticalSample). A configuration is
+reported on:
+    max angle error     Largest deviation of the rotor angles relative to GEN1 (degrees) from the
+                        stable golden trajectories (compared at the stored golden times)
+    CCT deviation       Largest deviation of the CCTs from the golden CCTs (s)
+    label agreement     Share of equal stability labels over the faults and a grid of clearing times
+                        (stable if cleared before the CCT), and of the labels of the trajectories
+    speedup             Reference time per simulated second / configuration time per simulated second
+                        (the reference is the golden configuration, timed on the golden trajectory
+                        runs in the same compare invocation; the golden file holds no timings)
+
+Usage (from the repository root):
+    python benchmarks/accuracy.py golden [--h 0.002] [--t_sim 3.0] [-o benchmarks/golden_case39.npz]
+    python benchmarks/accuracy.py compare [--golden benchmarks/golden_case39.npz] [--config h=0.01,iopt=mod_euler ...]
+
+Configurations are comma separated program options (dynopt) that override the defaults of the
+benchmarks (runge_kutta, h = 0.01, max_err = 1e-4, max_iter = 100).
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+from time import perf_counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+from pydyn.events import events
+from pydyn.recorder import recorder
+from pydyn.simulation import simulation
+from bench import program_options, make_elements, load_case, quiet, environment
+
+GOLDEN_FILE = os.path.join(ROOT, 'benchmarks', 'golden_case39.npz')
+
+# Branch faults (branch row, fault location along the branch)
+FAULTS = [(0, 0.5), (6, 0.5), (15, 0.5), (24, 0.5), (33, 0.5), (45, 0.5)]
+
+# Clearing time of the golden trajectories (s)
+CLEAR_TIME = 0.1
+
+# Upper bound of the CCT bisection (s), faults still stable at this clearing time have no CCT
+MAX_CLEAR_TIME = 0.5
+
+# Time step of the stored golden trajectories (s)
+STORE_H = 0.01
+
+# Clearing times of the label comparison (s)
+LABEL_GRID = np.round(np.arange(0.02, MAX_CLEAR_TIME + 1e-9, 0.02), 5)
+
+
+def parse_config(config):
+    """
+    Parse a configuration string (e.g. 'h=0.005,iopt=mod_euler') into a dictionary of program options
+    """
+    options = {}
+    for item in config.split(','):
+        if item.strip() == '':
+            continue
+        x, value = [token.strip() for token in item.split('=')]
+        if value in ['True', 'False']:
+            options[x] = value == 'True'
+        else:
+            try:
+                options[x] = int(value)
+            except ValueError:
+                try:
+                    options[x] = float(value)
+                except ValueError:
+                    options[x] = value
+
+    return options
+
+
+def stable(rel_angles):
+    # Same criterion as sample.TransientStability (relative rotor angle above 180 degrees)
+    return bool(np.all(np.abs(rel_angles) <= 180))
+
+
+class fault_runner:
+    def __init__(self, dynopt, directory):
+        """
+        Compile a case39 session for the program options and run faults with it (files written to directory)
+        """
+        self.h = dynopt['h']
+        self.t_sim = dynopt['t_sim']
+        self.directory = directory
+        self.record_file = os.path.join(directory, 'accuracy.rcd')
+        f = open(self.record_file, 'w')
+        f.write('GEN:delta, GEN, delta, STATE\n')
+        f.close()
+
+        self.ppc = load_case('case39')
+        with quiet():
+            self.sim = simulation(load_case('case39'), make_elements('case39', dynopt), dynopt)
+        self.runs = 0
+        self.wall = 0.0
+        self.simulated = 0.0
+
+    def run(self, branch, location, clear_steps):
+        """
+        Simulate a fault cleared after clear_steps time steps
+        Returns the times (s) and the rotor angles relative to GEN1 (degrees, time steps x generators 2..n)
+        """
+        event_file = os.path.join(self.directory, 'accuracy.evnt')
+        f = open(event_file, 'w')
+        f.write('0.0, BRANCH_FAULT, ' + str(branch) + ', 0, 0, ' + str(location) + '\n')
+        f.write(str(np.round(clear_steps * self.h, 5)) + ', CLEAR_BRANCH_FAULT, ' + str(branch) + '\n')
+        f.close()
+
+        oRecord = recorder(self.record_file, self.ppc)
+        t0 = perf_counter()
+        with quiet():
+            self.sim.run(events(event_file), oRecord)
+        self.wall = self.wall + perf_counter() - t0
+        self.simulated = self.simulated + self.t_sim
+        self.runs = self.runs + 1
+
+        deltas = np.array([oRecord.results['GEN:delta' + str(i + 1)] for i in range(self.ppc['number_gen'])]).T * 180 / np.pi
+        times = np.array(oRecord.t_axis) * self.h
+
+        return times, deltas[:, 1:] - deltas[:, :1]
+
+    def cct(self, branch, location):
+        """
+        Critical clearing time (s) by bisection of the clearing time in time steps
+        Returns nan if the fault is unstable when cleared after one step or stable at MAX_CLEAR_TIME
+        """
+        min_steps = 1
+        max_steps = int(round(MAX_CLEAR_TIME / self.h))
+        if not stable(self.run(branch, location, min_steps)[1]) or stable(self.run(branch, location, max_steps)[1]):
+            return np.nan
+
+        while min_steps < max_steps - 1:
+            steps = (min_steps + max_steps) // 2
+            if stable(self.run(branch, location, steps)[1]):
+                min_steps = steps
+            else:
+                max_steps = steps
+
+        return np.round(min_steps * self.h, 5)
+
+    def time_per_simulated_second(self):
+        return self.wall / self.simulated
+
+
+def store_times(times):
+    # Rows of the trajectories stored in the golden file (multiples of STORE_H)
+    steps = times / STORE_H
+    return np.flatnonzero(np.abs(steps - np.round(steps)) < 1e-6)
+
+
+def make_golden(filename, h, t_sim):
+    """
+    Simulate the golden trajectories and CCTs and write them to filename (.npz)
+    """
+    dynopt = program_options(t_sim)
+    dynopt['h'] = h
+    tmp = tempfile.mkdtemp()
+    try:
+        runner = fault_runner(dynopt, tmp)
+        clear_steps = int(round(CLEAR_TIME / h))
+        trajectories = []
+        labels = []
+        ccts = []
+        for branch, location in FAULTS:
+            print('Fault on branch ' + str(branch) + '...')
+            times, rel_angles = runner.run(branch, location, clear_steps)
+            rows = store_times(times)
+            trajectories.append(rel_angles[rows])
+            labels.append(stable(rel_angles))
+            ccts.append(runner.cct(branch, location))
+            print('    stable: ' + str(labels[-1]) + ', CCT: ' + str(ccts[-1]) + ' s')
+    finally:
+        shutil.rmtree(tmp)
+
+    settings = {'h': h, 't_sim': t_sim, 'iopt': dynopt['iopt'], 'max_err': dynopt['max_err'], 'max_iter': dynopt['max_iter'],
+                'clear_time': CLEAR_TIME, 'max_clear_time': MAX_CLEAR_TIME, 'environment': environment()}
+    np.savez_compressed(filename, faults=np.array(FAULTS), times=times[rows], trajectories=np.array(trajectories),
+                        labels=np.array(labels), ccts=np.array(ccts), settings=json.dumps(settings))
+    print('Golden trajectories written to ' + filename)
+
+
+def load_golden(filename):
+    with np.load(filename) as f:
+        golden = dict((x, f[x]) for x in f.files)
+    golden['settings'] = json.loads(str(golden['settings']))
+
+    return golden
+
+
+def reference_time(golden):
+    """
+    Time per simulated second (s) of the golden configuration on this machine, timed on the golden
+    trajectory runs (every fault cleared at the clearing time of the golden file)
+    """
+    settings = golden['settings']
+    dynopt = program_options(settings['t_sim'])
+    for x in ['h', 'iopt', 'max_err', 'max_iter']:
+        dynopt[x] = settings[x]
+
+    tmp = tempfile.mkdtemp()
+    try:
+        runner = fault_runner(dynopt, tmp)
+        clear_steps = int(round(settings['clear_time'] / dynopt['h']))
+        for branch, location in golden['faults'].tolist():
+            runner.run(int(branch), location, clear_steps)
+    finally:
+        shutil.rmtree(tmp)
+
+    return runner.time_per_simulated_second()
+
+
+def evaluate(golden, options, t_reference):
+    """
+    Simulate the golden faults with a configuration (dictionary of program options)
+    Returns a dictionary of the accuracy measures and the speedup over the reference time per
+    simulated second t_reference (see reference_time)
+    """
+    dynopt = program_options(golden['settings']['t_sim'])
+    dynopt.update(options)
+    h = dynopt['h']
+
+    tmp = tempfile.mkdtemp()
+    try:
+        runner = fault_runner(dynopt, tmp)
+        clear_steps = int(round(golden['settings']['clear_time'] / h))
+        angle_errors = []
+        label_matches = []
+        cct_errors = []
+        for n, (branch, location) in enumerate(golden['faults'].tolist()):
+            times, rel_angles = runner.run(int(branch), location, clear_steps)
+
+            # Configuration trajectories interpolated to the golden times
+            g_times = golden['times']
+            interp = np.array([np.interp(g_times, times, rel_angles[:, i]) for i in range(rel_angles.shape[1])]).T
+            if golden['labels'][n]:
+                angle_errors.append(float(np.max(np.abs(interp - golden['trajectories'][n]))))
+            label_matches.append(stable(rel_angles) == bool(golden['labels'][n]))
+
+            cct = runner.cct(int(branch), location)
+            g_cct = golden['ccts'][n]
+            if np.isnan(cct) and np.isnan(g_cct):
+                cct_errors.append(0.0)
+            elif np.isnan(cct) or np.isnan(g_cct):
+                cct_errors.append(np.inf)
+            else:
+                cct_errors.append(float(abs(cct - g_cct)))
+
+            # Labels over the clearing time grid (stable if cleared before the CCT)
+            for ct in LABEL_GRID:
+                label_matches.append(bool(ct <= cct) == bool(ct <= g_cct) if not (np.isnan(cct) or np.isnan(g_cct)) else np.isnan(cct) == np.isnan(g_cct))
+    finally:
+        shutil.rmtree(tmp)
+
+    return {'options': options,
+            'max_angle_error': max(angle_errors) if angle_errors else 0.0,
+            'angle_errors': angle_errors,
+            'max_cct_deviation': max(cct_errors),
+            'cct_deviations': cct_errors,
+            'label_agreement': float(np.mean(label_matches)),
+            'runs': runner.runs,
+            'time_per_simulated_second': runner.time_per_simulated_second(),
+            'speedup': t_reference / runner.time_per_simulated_second()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='PYPOWER-Dynamics accuracy harness')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    golden_parser = commands.add_parser('golden', help='simulate and store the golden trajectories and CCTs')
+    golden_parser.add_argument('--h', type=float, default=0.002, help='step size of the golden runs (s)')
+    golden_parser.add_argument('--t_sim', type=float, default=3.0, help='simulation time of the runs (s)')
+    golden_parser.add_argument('-o', '--output', default=GOLDEN_FILE, help='golden file (.npz)')
+
+    compare_parser = commands.add_parser('compare', help='compare engine configurations against the golden file')
+    compare_parser.add_argument('--golden', default=GOLDEN_FILE, help='golden file (.npz)')
+    compare_parser.add_argument('--config', action='append', default=None,
+                                help='program options of a configuration, e.g. h=0.01,iopt=mod_euler (repeatable)')
+    compare_parser.add_argument('-o', '--output', default=None, help='results file (JSON)')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'golden':
+        make_golden(args.output, args.h, args.t_sim)
+        return 0
+
+    golden = load_golden(args.golden)
+    configs = args.config if args.config is not None else ['h=0.01', 'h=0.01,iopt=mod_euler']
+
+    print('Timing the golden configuration...')
+    t_reference = reference_time(golden)
+    print('Golden configuration: ' + str(round(t_reference, 4)) + ' s per simulated second')
+
+    results = {'environment': environment(), 'golden': golden['settings'], 'reference_time_per_simulated_second': t_reference,
+               'configurations': []}
+    print('%-36s %16s %16s %10s %9s' % ('Configuration', 'Max angle (deg)', 'Max CCT dev. (s)', 'Labels', 'Speedup'))
+    for config in configs:
+        res = evaluate(golden, parse_config(config), t_reference)
+        res['config'] = config
+        results['configurations'].append(res)
+        print('%-36s %16.4f %16.4f %9.1f%% %9.2f' % (config, res['max_angle_error'], res['max_cct_deviation'],
+                                                   100 * res['label_agreement'], res['speedup']))
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print('Results written to ' + args.output)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
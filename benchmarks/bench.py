@@ -0,0 +1,372 @@
+#!python3
+#
+# Copyright (C) 2014-2015 Julius Susanto. All rights reserved.
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file.
+
+"""
+PYPOWER-Dynamics
+Benchmark Suite
+Times the simulation engine and sample generation, and compares the results against a saved baseline
+
+Benchmarks:
+    run_sim.<case>.<integrator>     Complete run_sim calls (setup and simulation) of case9 and case39
+                                    with the mod_euler and runge_kutta integrators
+    run_sim.case39_avr.<integrator> run_sim calls of case39 with a simple AVR controller on every
+                                    machine (controller banks and machine interfaces)
+    critical_sample.case39          One complete criticalSample bisection (single run)
+    recorder_write.<backend>        Writing the recorded variables of a case39 run with each output
+                                    backend (csv, csv_gz, compact_delta, compact_float32, store, excel)
+    solve_network.case39            Network solution in isolation (time per iteration)
+
+Usage (from the repository root):
+    python benchmarks/bench.py run [-o results.json] [--repeat 3] [--t_sim 5.0] [--only run_sim,solve_network]
+    python benchmarks/bench.py compare baseline.json results.json [--tolerance 0.2]
+
+Results are written as JSON with the environment (Python, platform, package versions, git commit).
+The comparison reports the ratio of the median times of every benchmark and exits with status 1
+if any benchmark is slower than the baseline by more than the tolerance.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from time import perf_counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.join(ROOT, 'benchmarks')
+sys.path.insert(0, ROOT)
+
+import numpy as np
+from pypower.loadcase import loadcase
+from pydyn.sym_order4 import sym_order4
+from pydyn.controller import controller
+from pydyn.events import events
+from pydyn.recorder import recorder
+from pydyn.run_sim import run_sim
+from pydyn.simulation import simulation, solve_network
+from pydyn.dataset import dataset_store
+from pydyn.version import pydyn_ver
+
+# Number of machines of each case (generator files G1.mach, G2.mach, ... in order of the generator rows)
+CASE_MACHINES = {'case9': 3, 'case39': 10}
+
+INTEGRATORS = ['mod_euler', 'runge_kutta']
+
+BACKENDS = ['csv', 'csv_gz', 'compact_delta', 'compact_float32', 'store', 'excel']
+
+# Simple AVR controller of the run_sim.case39_avr benchmarks (one per machine)
+AVR_TEMPLATE = """ID = AVR{n}
+Vt = INPUT(Vt, GEN{n})
+Verr = SUM(Vref, -Vt)
+Vr = LAG(Verr, 50, 0.05)
+Vfd_u = SUM(Vr, Vfd0)
+Vfd_l = LIM(Vfd_u, -5, 10)
+Vfd = OUTPUT(Vfd_l, GEN{n})
+INIT
+SIGNAL = Vref = SUM(Vt)
+SIGNAL = Vfd0 = SUM(Vfd)
+STATE = Vr = CONST(0)
+"""
+
+GROUPS = ['run_sim', 'critical_sample', 'recorder_write', 'solve_network']
+
+
+def program_options(t_sim, iopt='runge_kutta'):
+    dynopt = {}
+    dynopt['h'] = 1e-2
+    dynopt['t_sim'] = t_sim
+    dynopt['max_err'] = 1e-4
+    dynopt['max_iter'] = 100
+    dynopt['verbose'] = False
+    dynopt['fn'] = 60
+    dynopt['speed_volt'] = True
+    dynopt['iopt'] = iopt
+
+    return dynopt
+
+
+def make_elements(case, dynopt):
+    elements = {}
+    for i in range(CASE_MACHINES[case]):
+        G = sym_order4(os.path.join(ROOT, 'generator', 'G' + str(i + 1) + '.mach'), dynopt)
+        elements[G.id] = G
+
+    return elements
+
+
+def make_avrs(elements, directory, dynopt):
+    for i in range(len(elements)):
+        filename = os.path.join(directory, 'AVR' + str(i + 1) + '.dyn')
+        with open(filename, 'w') as f:
+            f.write(AVR_TEMPLATE.format(n=i + 1))
+        c = controller(filename, dynopt)
+        elements[c.id] = c
+
+    return elements
+
+
+def load_case(case):
+    return loadcase(os.path.join(ROOT, case + '.py'))
+
+
+def simulate(case, dynopt, avr_dir=None):
+    ppc = load_case(case)
+    elements = make_elements(case, dynopt)
+    if avr_dir is not None:
+        make_avrs(elements, avr_dir, dynopt)
+    oEvents = events(os.path.join(BENCH_DIR, case + '.evnt'))
+    oRecord = recorder(os.path.join(ROOT, 'recorder.rcd'), ppc)
+
+    return run_sim(ppc, elements, dynopt, oEvents, oRecord)
+
+
+@contextlib.contextmanager
+def quiet():
+    # Progress messages of the simulation are not part of the timings
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def timed(fn, repeat):
+    """
+    Returns the wall-clock times of repeat calls of fn, and the value returned by the last call
+    """
+    times = []
+    value = None
+    for i in range(repeat):
+        t0 = perf_counter()
+        with quiet():
+            value = fn(i)
+        times.append(perf_counter() - t0)
+
+    return times, value
+
+
+def result(times, **extra):
+    res = {'times': times, 'min': min(times), 'median': float(np.median(times)), 'unit': 's'}
+    res.update(extra)
+
+    return res
+
+
+def bench_run_sim(repeat, t_sim):
+    results = {}
+    for case in CASE_MACHINES:
+        for iopt in INTEGRATORS:
+            dynopt = program_options(t_sim, iopt)
+            times, oRecord = timed(lambda i: simulate(case, dynopt), repeat)
+            res = result(times, t_sim=t_sim, steps=len(oRecord.t_axis))
+            res['per_simulated_second'] = res['median'] / t_sim
+            results['run_sim.' + case + '.' + iopt] = res
+
+    avr_dir = tempfile.mkdtemp()
+    try:
+        for iopt in INTEGRATORS:
+            dynopt = program_options(t_sim, iopt)
+            times, oRecord = timed(lambda i: simulate('case39', dynopt, avr_dir), repeat)
+            res = result(times, t_sim=t_sim, steps=len(oRecord.t_axis))
+            res['per_simulated_second'] = res['median'] / t_sim
+            results['run_sim.case39_avr.' + iopt] = res
+    finally:
+        shutil.rmtree(avr_dir)
+
+    return results
+
+
+def bench_critical_sample(repeat, t_sim):
+    import sample
+
+    dynopt = program_options(t_sim)
+    elements = make_elements('case39', dynopt)
+    # The stability check of the sample module refers to its global elements
+    sample.elements = elements
+
+    fault = {'type': 'BRANCH_FAULT', 'object': '1', 'parameters': [0, 0, 0.5], 'clear_time': 0.3}
+
+    # The sample generator writes its event file to the working directory
+    cwd = os.getcwd()
+    tmp = tempfile.mkdtemp()
+    try:
+        shutil.copy(os.path.join(ROOT, 'recorder.rcd'), tmp)
+        os.chdir(tmp)
+        n_runs = len(sample.profiles)
+        times, value = timed(lambda i: sample.criticalSample(load_case('case39'), elements, dict(dynopt), dict(fault),
+                                                             dataset_store(os.path.join(tmp, 'store'))), 1)
+        n_runs = len(sample.profiles) - n_runs
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(tmp)
+
+    return {'critical_sample.case39': result(times, runs=n_runs)}
+
+
+def bench_recorder_write(repeat, t_sim):
+    with quiet():
+        oRecord = simulate('case39', program_options(t_sim))
+    oRecord.profile = None
+
+    writers = {'csv': lambda path: oRecord.write_output(path + '.csv'),
+               'csv_gz': lambda path: oRecord.write_output(path + '.csv.gz'),
+               'compact_delta': lambda path: oRecord.write_compact(path + '.npz', 'delta'),
+               'compact_float32': lambda path: oRecord.write_compact(path + '.npz', 'float32'),
+               'store': lambda path: oRecord.write_to_store(dataset_store(path)),
+               'excel': lambda path: oRecord.write_to_excel(path + '.xlsx')}
+
+    results = {}
+    tmp = tempfile.mkdtemp()
+    try:
+        for backend in BACKENDS:
+            times, value = timed(lambda i: writers[backend](os.path.join(tmp, backend + str(i))), repeat)
+            results['recorder_write.' + backend] = result(times, steps=len(oRecord.t_axis), channels=len(oRecord.recordset))
+    finally:
+        shutil.rmtree(tmp)
+
+    return results
+
+
+def bench_solve_network(repeat, t_sim):
+    dynopt = program_options(t_sim)
+    with quiet():
+        sim = simulation(load_case('case39'), make_elements('case39', dynopt), dynopt)
+    no_buses = len(sim.v0)
+
+    # Fixed number of iterations (no convergence check) from a perturbed voltage profile
+    n_iter = 1000
+    v_start = sim.v0 * 0.95
+    times, value = timed(lambda i: solve_network(sim.table, v_start, sim.Ybus_inv, no_buses, 0, n_iter + 1), repeat)
+    res = result([x / n_iter for x in times], iterations=n_iter)
+
+    return {'solve_network.case39': res}
+
+
+BENCHMARKS = {'run_sim': bench_run_sim,
+              'critical_sample': bench_critical_sample,
+              'recorder_write': bench_recorder_write,
+              'solve_network': bench_solve_network}
+
+
+def environment():
+    """
+    Returns a dictionary describing the machine and software the benchmarks were run with
+    """
+    from importlib.metadata import version, PackageNotFoundError
+
+    env = {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+           'python': platform.python_version(),
+           'implementation': platform.python_implementation(),
+           'platform': platform.platform(),
+           'machine': platform.machine(),
+           'processor': platform.processor(),
+           'cpu_count': os.cpu_count(),
+           'pydyn': pydyn_ver()['Version']}
+
+    for package in ['numpy', 'scipy', 'PYPOWER', 'matplotlib', 'pandas', 'openpyxl']:
+        try:
+            env[package.lower()] = version(package)
+        except PackageNotFoundError:
+            env[package.lower()] = None
+
+    try:
+        env['git_commit'] = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=ROOT,
+                                                    stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        env['git_commit'] = None
+
+    return env
+
+
+def run(groups, repeat, t_sim):
+    results = {'environment': environment(), 'settings': {'repeat': repeat, 't_sim': t_sim}, 'benchmarks': {}}
+    for group in groups:
+        print('Running ' + group + ' benchmarks...')
+        results['benchmarks'].update(BENCHMARKS[group](repeat, t_sim))
+
+    return results
+
+
+def compare(baseline, current, tolerance):
+    """
+    Print the ratio of the median times (current / baseline) of every benchmark
+    Returns the names of the benchmarks that are slower than the baseline by more than the tolerance
+    """
+    for x in ['python', 'platform', 'numpy', 'scipy']:
+        if baseline['environment'].get(x) != current['environment'].get(x):
+            print('Warning: ' + x + ' differs from the baseline (' + str(baseline['environment'].get(x)) + ' -> ' +
+                  str(current['environment'].get(x)) + ')')
+
+    regressions = []
+    print('%-32s %12s %12s %8s  %s' % ('Benchmark', 'Baseline (s)', 'Current (s)', 'Ratio', 'Status'))
+    for name in sorted(set(baseline['benchmarks']) | set(current['benchmarks'])):
+        if name not in baseline['benchmarks'] or name not in current['benchmarks']:
+            print('%-32s %s' % (name, 'missing in ' + ('baseline' if name not in baseline['benchmarks'] else 'current results')))
+            continue
+
+        old = baseline['benchmarks'][name]['median']
+        new = current['benchmarks'][name]['median']
+        ratio = new / old if old > 0 else float('inf')
+        if ratio > 1 + tolerance:
+            status = 'REGRESSION'
+            regressions.append(name)
+        elif ratio < 1 / (1 + tolerance):
+            status = 'faster'
+        else:
+            status = 'ok'
+        print('%-32s %12.6f %12.6f %8.3f  %s' % (name, old, new, ratio, status))
+
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='PYPOWER-Dynamics benchmark suite')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='run the benchmarks and write the results as JSON')
+    run_parser.add_argument('-o', '--output', default='benchmark_results.json', help='results file')
+    run_parser.add_argument('--repeat', type=int, default=3, help='repeats of each benchmark (median is compared)')
+    run_parser.add_argument('--t_sim', type=float, default=5.0, help='simulation time of the runs (s)')
+    run_parser.add_argument('--only', default=','.join(GROUPS), help='comma separated benchmark groups (' + ', '.join(GROUPS) + ')')
+
+    compare_parser = commands.add_parser('compare', help='compare results against a saved baseline')
+    compare_parser.add_argument('baseline', help='baseline results file')
+    compare_parser.add_argument('current', help='current results file')
+    compare_parser.add_argument('--tolerance', type=float, default=0.2, help='allowed slowdown (0.2 = 20%%)')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        groups = [x.strip() for x in args.only.split(',') if x.strip() != '']
+        for group in groups:
+            if group not in BENCHMARKS:
+                parser.error('unknown benchmark group "' + group + '" (use ' + ', '.join(GROUPS) + ')')
+
+        results = run(groups, args.repeat, args.t_sim)
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        for name, res in results['benchmarks'].items():
+            print('%-32s %12.6f s' % (name, res['median']))
+        print('Results written to ' + args.output)
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    regressions = compare(baseline, current, args.tolerance)
+    if regressions:
+        print(str(len(regressions)) + ' benchmark(s) slower than the baseline: ' + ', '.join(regressions))
+        return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,130 @@
+#!python3
+#
+# Copyright (C) 2014-2015 Julius Susanto. All rights reserved.
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file.
+
+"""
+PYPOWER-Dynamics
+Scaling Harness
+Times simulations of synthetic cases of increasing size (tiled copies of case39, see pydyn.synthetic)
+and reports the time per simulated second versus the number of buses
+
+Usage (from the repository root):
+    python benchmarks/scaling.py [--tiles 1,2,4,8,16,32] [--t_sim 1.0] [-o scaling.json] [--keep directory]
+
+Every case is simulated with a three-phase fault in the middle of the first branch (cleared after
+0.1 s), recording the rotor angles and the network solution health only. The setup (load flow,
+Ybus factorisation and initialisation) is timed separately from the run.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+from time import perf_counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from pypower.loadcase import loadcase
+from pydyn.synthetic import make_case
+from pydyn.fleet import fleet
+from pydyn.events import events
+from pydyn.recorder import recorder
+from pydyn.simulation import simulation
+from bench import program_options, quiet, environment
+
+# Phases reported in the table (share of the run time)
+TABLE_PHASES = ['solve_step', 'solve_network', 'branch_flows', 'recorder']
+
+
+def scale_case(n_tiles, t_sim, directory):
+    """
+    Build, set up and run the case of n_tiles tiles in directory
+    Returns a dictionary of sizes, timings and run statistics
+    """
+    case_file, machine_files, fleet_file = make_case(directory, n_tiles, os.path.join(ROOT, 'case39.py'),
+                                                     [os.path.join(ROOT, 'generator', 'G' + str(i + 1) + '.mach') for i in range(10)])
+
+    event_file = os.path.join(directory, 'scaling.evnt')
+    f = open(event_file, 'w')
+    f.write('0.0, BRANCH_FAULT, 1, 0, 0, 0.5\n0.1, CLEAR_BRANCH_FAULT, 1\n')
+    f.close()
+
+    record_file = os.path.join(directory, 'scaling.rcd')
+    f = open(record_file, 'w')
+    f.write('GEN:delta, GEN, delta, STATE\nNET:iterations, NET, iterations\nNET:nonconv, NET, nonconv\n')
+    f.close()
+
+    dynopt = program_options(t_sim)
+    ppc = loadcase(case_file)
+    elements = fleet(fleet_file).elements(dynopt)
+
+    with quiet():
+        t0 = perf_counter()
+        sim = simulation(ppc, elements, dynopt)
+        t_setup = perf_counter() - t0
+
+        oRecord = recorder(record_file, ppc)
+        t0 = perf_counter()
+        sim.run(events(event_file), oRecord)
+        t_run = perf_counter() - t0
+
+    report = sim.profile.report()
+    run_time = sum(report['times'][x] for x in report['times'] if x not in ['power_flow', 'ybus', 'factorise', 'initialise']) or t_run
+    res = {'tiles': n_tiles,
+           'buses': ppc["number_bus"],
+           'generators': ppc["number_gen"],
+           'branches': ppc["number_branch"],
+           't_sim': t_sim,
+           'setup': t_setup,
+           'run': t_run,
+           'per_simulated_second': t_run / t_sim,
+           'network_iterations_per_step': report.get('network_iterations_per_step'),
+           'failure': oRecord.failure,
+           'phases': report['times']}
+    res['phase_shares'] = dict((x, report['times'][x] / run_time) for x in TABLE_PHASES)
+
+    return res
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='PYPOWER-Dynamics scaling harness')
+    parser.add_argument('--tiles', default='1,2,4,8,16,32', help='comma separated numbers of case39 tiles')
+    parser.add_argument('--t_sim', type=float, default=1.0, help='simulation time of the runs (s)')
+    parser.add_argument('-o', '--output', default=None, help='results file (JSON)')
+    parser.add_argument('--keep', default=None, help='directory to keep the generated cases in')
+    args = parser.parse_args(argv)
+
+    tiles = [int(x) for x in args.tiles.split(',') if x.strip() != '']
+    base = args.keep if args.keep is not None else tempfile.mkdtemp()
+
+    results = {'environment': environment(), 'cases': []}
+    print('%6s %7s %6s %10s %10s %14s %8s  %s' % ('Tiles', 'Buses', 'Gens', 'Setup (s)', 'Run (s)', 's per sim. s',
+                                                   'It/step', '  '.join('%-13s' % x for x in TABLE_PHASES)))
+    try:
+        for n_tiles in tiles:
+            res = scale_case(n_tiles, args.t_sim, os.path.join(base, 'case39x' + str(n_tiles)))
+            results['cases'].append(res)
+            print('%6d %7d %6d %10.3f %10.3f %14.3f %8.2f  %s' % (
+                res['tiles'], res['buses'], res['generators'], res['setup'], res['run'], res['per_simulated_second'],
+                res['network_iterations_per_step'], '  '.join('%-13s' % ('%.1f%%' % (100 * res['phase_shares'][x])) for x in TABLE_PHASES)))
+            if res['failure'] is not None:
+                print('       run aborted: ' + res['failure']['message'])
+    finally:
+        if args.keep is None:
+            shutil.rmtree(base)
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print('Results written to ' + args.output)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
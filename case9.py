@@ -69,7 +69,16 @@ def case9():
         [4, 5, 0.01,   0.085,  0.176, 250, 250, 250, 0, 0, 1, -360, 360]
     ])
 
+    ppc["fault"] = []
     ppc["number_branch"] = len(ppc["branch"])
+    ppc["number_bus"] = len(ppc["bus"])
+    ppc["number_gen"] = len(ppc["gen"])
+
+    ppc["load"] = []
+    for i in range(ppc["number_bus"]):
+        if ppc["bus"][i][2] != 0:
+            ppc["load"].append([ppc["bus"][i][2], ppc["bus"][i][3]])
+    ppc["number_load"] = len(ppc["load"])
     ##-----  OPF Data  -----##
     ## area data
     # area refbus
@@ -14,9 +14,11 @@ Milano, F., "Power System Modelling and Scripting", Springer-Verlag, 2010
 """
 
 import numpy as np
+from pydyn.registry import register_model
+from pydyn.element_state import element_state
 
-class asym_2cage:
-    def __init__(self, filename, dynopt):
+class asym_2cage(element_state):
+    def __init__(self, filename, dynopt, params=None):
         self.signals = {}
         self.states = {}
         self.states0 = {}
@@ -25,7 +27,10 @@ class asym_2cage:
         self.opt = dynopt['iopt']
         self.omega_n = 2 * np.pi * dynopt['fn']
         
-        self.parser(filename)
+        if params is None:
+            self.parser(filename)
+        else:
+            self.set_params(params)
         
         # Convert parameters to 100MVA base
         if 'MVA_Rating' in self.params.keys():
@@ -68,6 +73,17 @@ class asym_2cage:
                 
         f.close()
     
+    def set_params(self, params):
+        """
+        Populate the dictionary of parameters from a dictionary of values (e.g. a row of a fleet file)
+        instead of a machine file
+        """
+        self.id = params['ID']
+        self.bus_no = int(params['BUS_NO'])
+        for x, value in params.items():
+            if x not in ['ID', 'BUS_NO']:
+                self.params[x] = float(value)
+    
     def initialise(self, vt0, S0):
         """
         Initialise machine signals and states based on load flow voltage and complex power injection
@@ -312,4 +328,7 @@ class asym_2cage:
         
         if round(dEdp,6) != 0 or round(dEqp,6) != 0 or round(ds,6) != 0:
             print('Warning: differential equations not zero on initialisation...')
-            print('dEdp = ' + str(dEdp) + ', dEqp = ' + str(dEqp) + ', ds = ' + str(ds))
\ No newline at end of file
+            print('dEdp = ' + str(dEdp) + ', dEqp = ' + str(dEqp) + ', ds = ' + str(ds))
+
+
+register_model(asym_2cage, 'bus')
@@ -0,0 +1,229 @@
+#!python3
+#
+# Copyright (C) 2014-2015 Julius Susanto. All rights reserved.
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file.
+
+"""
+PYPOWER-Dynamics
+Batch Power Flow Class
+Newton-Raphson power flow of many operating points (scenarios) of the same network solved together
+
+Only the bus loads (PD, QD) and the generator set points (PG) vary between scenarios, so the Ybus
+and the sparsity pattern of the power flow Jacobian are shared:
+    - mismatches and Jacobian values of all scenarios are computed in vectorised form (scenarios x
+      nonzeros) on the shared Ybus and Jacobian patterns
+    - the Jacobians of the scenarios that have not converged are stacked in one block-diagonal
+      matrix and factorised with a single call per iteration
+    - a fill-reducing column ordering of the Jacobian is computed once and reused for every block
+      and iteration (the symbolic ordering is not recomputed)
+
+The solved scenarios are returned as PYPOWER cases with the solved bus voltages and generator
+outputs, which can be passed to the simulation as its load flow (see simulation pf_results), so
+that the load flow is not rerun for the source initialisation.
+"""
+
+import copy
+import numpy as np
+from scipy.sparse import csc_matrix, csr_matrix
+from scipy.sparse.linalg import splu
+from pypower.ext2int import ext2int
+from pypower.makeYbus import makeYbus
+from pypower.bustypes import bustypes
+from pypower.idx_bus import PD, QD, VM, VA
+from pypower.idx_gen import GEN_BUS, PG, QG, VG, GEN_STATUS
+from pypower.idx_brch import QT
+from pydyn.operating_point import solved_case
+
+
+class batch_power_flow:
+    def __init__(self, ppc):
+        """
+        Set up the shared network matrices, Jacobian pattern and column ordering of a case
+        """
+        # Branch flow columns are added to the case (as in runpf), and removed from the solved cases
+        ppc = copy.deepcopy(ppc)
+        self.branch_cols = ppc["branch"].shape[1]
+        if ppc["branch"].shape[1] < QT + 1:
+            ppc["branch"] = np.c_[ppc["branch"], np.zeros((ppc["branch"].shape[0], QT + 1 - ppc["branch"].shape[1]))]
+        self.ppc_int = ext2int(ppc)
+        baseMVA, bus, gen, branch = self.ppc_int["baseMVA"], self.ppc_int["bus"], self.ppc_int["gen"], self.ppc_int["branch"]
+        self.Ybus, self.Yf, self.Yt = makeYbus(baseMVA, bus, branch)
+        self.ref, self.pv, self.pq = bustypes(bus, gen)
+        self.pvpq = np.r_[self.pv, self.pq]
+        nb = bus.shape[0]
+
+        # In-service generators and their buses
+        self.gen_on = np.flatnonzero(gen[:, GEN_STATUS] > 0)
+        self.gen_bus = gen[self.gen_on, GEN_BUS].astype(int)
+        self.Cg = csr_matrix((np.ones(len(self.gen_on)), (self.gen_bus, np.arange(len(self.gen_on)))), (nb, len(self.gen_on)))
+
+        # Initial state of the case, with the generator voltage set points at the generator buses
+        V0 = bus[:, VM] * np.exp(1j * np.radians(bus[:, VA]))
+        V0[self.gen_bus] = gen[self.gen_on, VG] / np.abs(V0[self.gen_bus]) * V0[self.gen_bus]
+        self.V0 = V0
+
+        # Ybus nonzeros (with explicit diagonal entries)
+        Y = (self.Ybus + csr_matrix((np.zeros(nb), (np.arange(nb), np.arange(nb))), (nb, nb))).tocoo()
+        self.y_row, self.y_col, self.y_val = Y.row, Y.col, Y.data
+        nnz = len(self.y_val)
+        diag = np.flatnonzero(self.y_row == self.y_col)
+        self.y_diag = diag[np.argsort(self.y_row[diag])]
+
+        # Jacobian entries: (row, column, source) with the source an index into the stacked values
+        # [Re dS/dVa, Re dS/dVm, Im dS/dVa, Im dS/dVm] of the Ybus nonzeros
+        n_pvpq = len(self.pvpq)
+        pos_pvpq = -np.ones(nb, dtype=int)
+        pos_pvpq[self.pvpq] = np.arange(n_pvpq)
+        pos_pq = -np.ones(nb, dtype=int)
+        pos_pq[self.pq] = np.arange(len(self.pq))
+        r, c = self.y_row, self.y_col
+        rows, cols, source = [], [], []
+        for block, (row_pos, row_off, col_pos, col_off) in enumerate([(pos_pvpq, 0, pos_pvpq, 0), (pos_pvpq, 0, pos_pq, n_pvpq),
+                                                                      (pos_pq, n_pvpq, pos_pvpq, 0), (pos_pq, n_pvpq, pos_pq, n_pvpq)]):
+            k = np.flatnonzero((row_pos[r] >= 0) & (col_pos[c] >= 0))
+            rows.append(row_pos[r[k]] + row_off)
+            cols.append(col_pos[c[k]] + col_off)
+            source.append(k + block * nnz)
+        rows, cols, source = np.concatenate(rows), np.concatenate(cols), np.concatenate(source)
+        self.m = n_pvpq + len(self.pq)
+
+        # Fill-reducing column ordering of the Jacobian at the initial state (computed once)
+        J = csc_matrix((self.values(V0[None, :])[0, source], (rows, cols)), (self.m, self.m))
+        order = np.argsort(splu(J).perm_c)
+        self.order = order
+        position = np.empty(self.m, dtype=int)
+        position[order] = np.arange(self.m)
+
+        # Compressed column pattern of the column-permuted Jacobian (entries sorted by column, then row)
+        pcols = position[cols]
+        sort = np.lexsort((rows, pcols))
+        self.j_rows = rows[sort]
+        self.j_source = source[sort]
+        self.j_indptr = np.r_[0, np.cumsum(np.bincount(pcols, minlength=self.m))]
+
+        self.V = None
+        self.success = None
+        self.iterations = None
+
+    def values(self, V):
+        """
+        Stacked Jacobian source values of the Ybus nonzeros for an array of bus voltages (scenarios x buses)
+        """
+        Ibus = (self.Ybus @ V.T).T
+        Vnorm = V / np.abs(V)
+        r, c, y = self.y_row, self.y_col, self.y_val
+
+        # dS/dVm = diag(V) conj(Ybus diag(Vnorm)) + conj(diag(Ibus)) diag(Vnorm)
+        dSm = V[:, r] * np.conj(y * Vnorm[:, c])
+        dSm[:, self.y_diag] = dSm[:, self.y_diag] + np.conj(Ibus) * Vnorm
+        # dS/dVa = j diag(V) conj(diag(Ibus) - Ybus diag(V))
+        dSa = -1j * V[:, r] * np.conj(y * V[:, c])
+        dSa[:, self.y_diag] = dSa[:, self.y_diag] + 1j * V * np.conj(Ibus)
+
+        return np.concatenate([dSa.real, dSm.real, dSa.imag, dSm.imag], axis=1)
+
+    def scaled(self, load_scale, gen_scale=1.0):
+        """
+        Returns the bus loads and generator set points (pd, qd, pg in MW / MVAr, scenarios x internal rows)
+        of load and generation scalings of the case (as operating_point_sampler.solve, the generator set
+        points are not scaled by default)
+        """
+        load_scale = np.atleast_1d(np.asarray(load_scale, dtype=float))
+        gen_scale = np.broadcast_to(np.asarray(gen_scale, dtype=float), load_scale.shape)
+        bus, gen = self.ppc_int["bus"], self.ppc_int["gen"]
+
+        return np.outer(load_scale, bus[:, PD]), np.outer(load_scale, bus[:, QD]), np.outer(gen_scale, gen[:, PG])
+
+    def solve(self, pd, qd, pg, V0=None, max_it=10, tol=1e-8):
+        """
+        Solve the power flows of a batch of scenarios
+
+        Inputs:
+            pd, qd      Bus loads (MW, MVAr), scenarios x buses (in the internal bus order, i.e. the
+                        in-service buses of the case)
+            pg          Generator set points (MW), scenarios x generators (internal generator order)
+            V0          Initial bus voltages (scenarios x buses), defaults to the state of the case
+            max_it      Maximum number of Newton-Raphson iterations
+            tol         Tolerance of the power mismatches (pu)
+
+        Outputs:
+            V           Bus voltages (scenarios x buses)
+            success     Converged scenarios (boolean array)
+            iterations  Iterations of each scenario
+        """
+        baseMVA = self.ppc_int["baseMVA"]
+        pd, qd, pg = np.atleast_2d(pd), np.atleast_2d(qd), np.atleast_2d(pg)
+        n_s = pd.shape[0]
+        self.pd, self.qd, self.pg = pd, qd, pg
+
+        # Bus power injections of the scenarios (pu)
+        Sg = pg[:, self.gen_on] + 1j * self.ppc_int["gen"][self.gen_on, QG]
+        Sbus = ((self.Cg @ Sg.T).T - (pd + 1j * qd)) / baseMVA
+
+        if V0 is None:
+            V = np.tile(self.V0, (n_s, 1))
+        else:
+            V = np.array(V0, dtype=complex).reshape(n_s, -1)
+        Va = np.angle(V)
+        Vm = np.abs(V)
+
+        m = self.m
+        n_pvpq = len(self.pvpq)
+        nnz = len(self.j_rows)
+        success = np.zeros(n_s, dtype=bool)
+        failed = np.zeros(n_s, dtype=bool)
+        iterations = np.zeros(n_s, dtype=int)
+        norm_prev = np.full(n_s, np.inf)
+        growing = np.zeros(n_s, dtype=int)
+
+        for i in range(max_it + 1):
+            # Stacked mismatches of all scenarios
+            mis = V * np.conj((self.Ybus @ V.T).T) - Sbus
+            F = np.concatenate([mis[:, self.pvpq].real, mis[:, self.pq].imag], axis=1)
+            norm = np.max(np.abs(F), axis=1)
+
+            # Converged and diverging scenarios (mismatch growing in two consecutive iterations) drop out
+            running = ~success & ~failed
+            success = success | (running & (norm < tol))
+            growing = np.where(norm > norm_prev, growing + 1, 0)
+            failed = failed | (running & ~success & ((growing >= 2) | ~np.isfinite(norm)))
+            norm_prev = norm
+
+            active = np.flatnonzero(~success & ~failed)
+            if len(active) == 0 or i == max_it:
+                break
+            iterations[active] = iterations[active] + 1
+
+            # Block-diagonal Jacobian of the active scenarios (shared pattern and column ordering)
+            n_a = len(active)
+            data = self.values(V[active])[:, self.j_source].ravel()
+            indices = (self.j_rows[None, :] + m * np.arange(n_a)[:, None]).ravel()
+            indptr = np.r_[(self.j_indptr[:-1][None, :] + nnz * np.arange(n_a)[:, None]).ravel(), n_a * nnz]
+            J = csc_matrix((data, indices, indptr), (n_a * m, n_a * m))
+            y = splu(J, permc_spec='NATURAL').solve(-F[active].ravel())
+            dx = np.empty((n_a, m))
+            dx[:, self.order] = y.reshape(n_a, m)
+
+            Va[np.ix_(active, self.pvpq)] = Va[np.ix_(active, self.pvpq)] + dx[:, :n_pvpq]
+            Vm[np.ix_(active, self.pq)] = Vm[np.ix_(active, self.pq)] + dx[:, n_pvpq:]
+            V[active] = Vm[active] * np.exp(1j * Va[active])
+
+        self.V, self.success, self.iterations = V, success, iterations
+
+        return V, success, iterations
+
+    def case(self, i):
+        """
+        Returns the PYPOWER case of solved scenario i, with the solved bus voltages and generator outputs
+        """
+        if self.success is None or not self.success[i]:
+            raise ValueError('Scenario ' + str(i) + ' has not been solved')
+
+        bus = self.ppc_int["bus"].copy()
+        gen = self.ppc_int["gen"].copy()
+        bus[:, PD] = self.pd[i]
+        bus[:, QD] = self.qd[i]
+        gen[:, PG] = self.pg[i]
+
+        return solved_case(self.ppc_int, bus, gen, self.Ybus, self.Yf, self.Yt, self.V[i], self.ref, self.pv, self.pq, self.branch_cols)
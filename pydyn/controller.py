@@ -13,8 +13,10 @@ Parses, initialises and solves a dynamic controller model file (*.dyn)
 
 import pydyn.explicit_blocks as blocks
 import numpy as np
+from pydyn.registry import register_model
+from pydyn.element_state import element_state
 
-class controller:
+class controller(element_state):
     def __init__(self, filename, dynopt):
         self.id = ''
         self.signals = {}
@@ -26,6 +28,7 @@ class controller:
         self.opt = dynopt['iopt']
         
         self.parser(filename)
+        self.compile()
     
     def parser(self, filename):
         """
@@ -100,93 +103,142 @@ class controller:
             elif type == 'STATE':
                 self.states[var] = yo
     
-    def solve_step(self,h,dstep):
+    def compile(self):
         """
-        Solve controller for the next time step
+        Compile the model equations into an execution plan of (signal, block function, inputs, parameters, dynamic)
+        entries with pre-parsed numeric parameters and resolved input signals, so that solve_step does not
+        interpret the equations on every integration stage
         """
-        if self.opt == 'runge_kutta' and dstep in [0,1]:
-            # Halve the step size for 1st and 2nd steps of 4th order Runge-Kutta method
-            h = h / 2
-                
+        self.plan = []
         for line in self.equations:
             signal = line[0]
             block = line[1]
-                       
-            # Current state variable(s)
-            x0 = self.states[signal]
             
-            yo = None
-            x1 = None
-
             if block == 'CONST':
-                yo = float(line[2])
+                self.plan.append((signal, const_block, None, float(line[2]), False))
             
             elif block == 'GAIN':
-                yi = self.signals[line[2]]
-                p = float(line[3])
-                yo = blocks.gain_block(yi,p)
+                self.plan.append((signal, blocks.gain_block, line[2], float(line[3]), False))
             
             elif block == 'INT':
-                yi = self.signals[line[2]]
-                p = [float(x) for x in line[3:]]
-                yo, x1, f = blocks.int_block(h,x0,yi,p)
+                self.plan.append((signal, blocks.int_block, line[2], [float(x) for x in line[3:]], True))
             
             elif block == 'LAG':
-                yi = self.signals[line[2]]
-                p = [float(x) for x in line[3:]]
-                yo, x1, f = blocks.lag_block(h,x0,yi,p) 
+                self.plan.append((signal, blocks.lag_block, line[2], [float(x) for x in line[3:]], True))
             
             elif block == 'LDLAG':
-                yi = self.signals[line[2]]
-                p = [float(x) for x in line[3:]]
-                yo, x1, f = blocks.leadlag_block(h,x0,yi,p)
+                self.plan.append((signal, blocks.leadlag_block, line[2], [float(x) for x in line[3:]], True))
             
             elif block == 'LIM':
-                yi = self.neg_token(line[2:])
-                p = [float(x) for x in line[3:]]
-                yo = blocks.lim_block(yi,p)
-                
+                self.plan.append((signal, blocks.lim_block, self.resolve_tokens(line[2:3])[0], [float(x) for x in line[3:]], False))
+            
             elif block == 'MULT':
-                yi = self.neg_token(line[2:])
-                yo = blocks.mult_block(yi)
+                self.plan.append((signal, blocks.mult_block, self.resolve_tokens(line[2:]), None, False))
             
             elif block == 'OUTPUT':
-                self.signals[signal] = self.signals[line[2]]
+                self.plan.append((signal, output_block, line[2], None, False))
             
             elif block == 'SUM':
-                yi = self.neg_token(line[2:])
-                yo = blocks.sum_block(yi)
+                self.plan.append((signal, blocks.sum_block, self.resolve_tokens(line[2:]), None, False))
             
             elif block == 'WOUT':
-                yi = self.signals[line[2]]
-                p = float(line[3])
-                yo, x1, f = blocks.wout_block(h,x0,yi,p)                
-            
-            if yo:
-                self.signals[signal] = yo
-            
-            if x1:
-                if self.opt == 'mod_euler':
-                    if dstep == 0:
-                        self.states[signal] = x1
-                        self.dsteps[signal] = [f]
-                    elif dstep == 1:
-                        self.states[signal] = x1 - h * self.dsteps[signal][0]
-                        
-                elif self.opt == 'runge_kutta':
-                    if dstep == 0:
-                        self.states0[signal] = x0
-                        self.states[signal] = x1
-                        self.dsteps[signal] = [f * 2 * h]
-                    elif dstep == 1:
-                        self.states[signal] = x1
-                        self.dsteps[signal].append(f * 2 * h)
-                    elif dstep == 2:
-                        self.states[signal] = x1
-                        self.dsteps[signal].append(f * h)
-                    elif dstep == 3:
-                        self.states[signal] = self.states0[signal] + 1/6 * (self.dsteps[signal][0] + 2*self.dsteps[signal][1] + 2*self.dsteps[signal][2] + f * h)
+                self.plan.append((signal, blocks.wout_block, line[2], float(line[3]), True))
+    
+    def structure(self):
+        """
+        Returns a hashable description of the equation structure (block types and signal connections, without
+        numeric parameters or machine IDs). Controllers with the same structure can be stepped in one bank.
+        """
+        eqs = []
+        for line in self.equations:
+            if line[1] in ['SUM', 'MULT']:
+                tokens = tuple((None if x is None else c, x) for c, x in self.resolve_tokens(line[2:]))
+            elif line[1] in ['CONST', 'INPUT', 'OUTPUT']:
+                tokens = tuple(line[2:3]) if line[1] != 'CONST' else ()
+            elif line[1] == 'LIM':
+                tokens = tuple(self.resolve_tokens(line[2:3]))
+            else:
+                tokens = (line[2], len(line) - 3)
+            eqs.append((line[0], line[1], tokens))
+        
+        return (self.opt, tuple(eqs), tuple(sorted(self.signals)), tuple(sorted(self.states)))
+    
+    def solve_step(self,h,dstep):
+        """
+        Solve controller for the next time step
+        """
+        if self.opt == 'runge_kutta' and dstep in [0,1]:
+            # Halve the step size for 1st and 2nd steps of 4th order Runge-Kutta method
+            h = h / 2
+        
+        signals = self.signals
+        states = self.states
+        for signal, block, yi, p, dynamic in self.plan:
+            if dynamic:
+                # Current state variable
+                x0 = states[signal]
+                yo, x1, f = block(h, x0, signals[yi], p)
+                signals[signal] = yo
+                self.update_state(signal, x0, x1, f, h, dstep)
+            
+            elif block is blocks.lim_block:
+                yo = block(yi[0] * signals[yi[1]], p)
+                signals[signal] = yo
+            
+            elif block is blocks.gain_block:
+                signals[signal] = block(signals[yi], p)
+            
+            elif block is blocks.sum_block or block is blocks.mult_block:
+                signals[signal] = block([c if x is None else c * signals[x] for c, x in yi])
+            
+            elif block is output_block:
+                signals[signal] = signals[yi]
+            
+            else:
+                signals[signal] = p
+    
+    def update_state(self, signal, x0, x1, f, h, dstep):
+        """
+        Update a state variable for the current stage of the integration step
+        """
+        if self.opt == 'mod_euler':
+            if dstep == 0:
+                self.states[signal] = x1
+                self.dsteps[signal] = [f]
+            elif dstep == 1:
+                self.states[signal] = x1 - h * self.dsteps[signal][0]
                 
+        elif self.opt == 'runge_kutta':
+            if dstep == 0:
+                self.states0[signal] = x0
+                self.states[signal] = x1
+                self.dsteps[signal] = [f * 2 * h]
+            elif dstep == 1:
+                self.states[signal] = x1
+                self.dsteps[signal].append(f * 2 * h)
+            elif dstep == 2:
+                self.states[signal] = x1
+                self.dsteps[signal].append(f * h)
+            elif dstep == 3:
+                self.states[signal] = self.states0[signal] + 1/6 * (self.dsteps[signal][0] + 2*self.dsteps[signal][1] + 2*self.dsteps[signal][2] + f * h)
+    
+    def resolve_tokens(self, tokens):
+        """
+        Resolve a list of block input tokens into (coefficient, signal) pairs
+        Numeric tokens are returned as (value, None)
+        """
+        yi = []
+        for x in tokens:
+            try:
+                yi.append((float(x), None))
+            except ValueError:
+                if x[0] == '-':
+                    yi.append((-1.0, x[1:]))
+                else:
+                    yi.append((1.0, x))
+        
+        return yi
+    
     def neg_token(self, tokens):
         """
         Consider negative sign in list of tokens
@@ -201,4 +253,82 @@ class controller:
             else:
                 yi.append(self.signals[x])
         
-        return yi
\ No newline at end of file
+        return yi
+
+
+def const_block(yi, p):
+    # Constant block (placeholder function for the execution plan)
+    return p
+
+
+def output_block(yi, p):
+    # Output block (placeholder function for the execution plan)
+    return yi
+
+
+class linear_segment:
+    """
+    Run of consecutive linear blocks of a controller fused into a single matrix M (used by the stacked
+    segments of pydyn.controller_bank), such that one integration stage is
+    
+        [yo; x1; f] = M(h) * [x0; u; 1]
+    
+    where x0 are the block states at the start of the stage, u the signals read from outside the run,
+    yo the signals written by the run, and x1 and f the new block states and their derivatives.
+    M is built by evaluating the block functions on linear forms and is cached per step size h.
+    """
+    def __init__(self, entries):
+        self.entries = entries
+        self.xs = [entry[0] for entry in entries if entry[4]]
+        self.us = []
+        self.ys = []
+        for signal, block, yi, p, dynamic in entries:
+            if block is blocks.sum_block:
+                inputs = [x for c, x in yi if x is not None]
+            elif block is const_block:
+                inputs = []
+            else:
+                inputs = [yi]
+            
+            for x in inputs:
+                if x not in self.ys and x not in self.us:
+                    self.us.append(x)
+            if signal not in self.ys:
+                self.ys.append(signal)
+        
+        self.matrices = {}
+    
+    def build(self, h):
+        """
+        Build the segment matrix for step size h
+        """
+        nx = len(self.xs)
+        eye = np.eye(nx + len(self.us) + 1)
+        one = eye[-1]
+        
+        forms = {}
+        for x in self.us:
+            forms[x] = eye[nx + self.us.index(x)]
+        
+        x1s = []
+        fs = []
+        for signal, block, yi, p, dynamic in self.entries:
+            if dynamic:
+                yo, x1, f = block(h, eye[self.xs.index(signal)], forms[yi], p)
+                x1s.append(x1)
+                fs.append(f)
+            elif block is blocks.sum_block:
+                yo = block([c * one if x is None else c * forms[x] for c, x in yi])
+            elif block is blocks.gain_block:
+                yo = block(forms[yi], p)
+            elif block is output_block:
+                yo = forms[yi]
+            else:
+                yo = p * one
+            
+            forms[signal] = yo
+        
+        return np.vstack([forms[y] for y in self.ys] + x1s + fs)
+
+
+register_model(controller, 'controller')
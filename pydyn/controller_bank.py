@@ -0,0 +1,188 @@
+#!python3
+#
+# Copyright (C) 2014-2015 Julius Susanto. All rights reserved.
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file.
+
+"""
+PYPOWER-Dynamics
+Controller Bank Class
+Steps a group of controllers that share the same equation structure (e.g. the same AVR or governor
+template attached to every machine) in one vectorised call, with per-instance parameters as arrays
+
+"""
+
+import pydyn.explicit_blocks as blocks
+from pydyn.controller import linear_segment
+from collections.abc import MutableMapping
+import numpy as np
+
+
+def make_banks(controllers):
+    """
+    Group initialised controllers by equation structure
+    Returns a list of controller banks (groups of two or more) and a list of the remaining controllers
+    """
+    groups = {}
+    for ctrl in controllers:
+        groups.setdefault(ctrl.structure(), []).append(ctrl)
+
+    banks = []
+    singles = []
+    for group in groups.values():
+        if len(group) > 1:
+            banks.append(controller_bank(group))
+        else:
+            singles.extend(group)
+
+    return banks, singles
+
+
+class controller_bank:
+    def __init__(self, ctrls):
+        """
+        Build a bank from a list of initialised controllers with the same structure
+        The signals and states of each controller are moved into the bank arrays (one column per controller)
+        and the controller dictionaries are replaced by views of these columns
+        """
+        self.ctrls = ctrls
+        self.opt = ctrls[0].opt
+        self.id = [ctrl.id for ctrl in ctrls]
+        n = len(ctrls)
+
+        self.sig_rows = dict((x, i) for i, x in enumerate(ctrls[0].signals))
+        self.state_rows = dict((x, i) for i, x in enumerate(ctrls[0].states))
+        self.signals = np.array([[ctrl.signals[x] for ctrl in ctrls] for x in self.sig_rows], dtype=float).reshape(-1, n)
+        self.states = np.array([[ctrl.states[x] for ctrl in ctrls] for x in self.state_rows], dtype=float).reshape(-1, n)
+
+        for i in range(n):
+            ctrls[i].signals = bank_view(self.signals, self.sig_rows, i)
+            ctrls[i].states = bank_view(self.states, self.state_rows, i)
+
+        self.compile()
+
+    def compile(self):
+        """
+        Build the bank execution plan from the block plans of the instances: runs of linear blocks become
+        stacked linear segments, LIM and MULT are evaluated as vectorised array operations
+        """
+        self.plan = []
+        plans = [ctrl.plan for ctrl in self.ctrls]
+        run = []
+        for j in range(len(plans[0]) + 1):
+            entries = [plan[j] for plan in plans] if j < len(plans[0]) else None
+            if entries is not None and entries[0][1] not in [blocks.lim_block, blocks.mult_block]:
+                run.append(entries)
+                continue
+
+            if run:
+                segs = [linear_segment([entries_k[i] for entries_k in run]) for i in range(len(self.ctrls))]
+                self.plan.append(('SEGMENT', {'segs': segs,
+                                              'xs': [self.state_rows[x] for x in segs[0].xs],
+                                              'us': [self.sig_rows[x] for x in segs[0].us],
+                                              'ys': [self.sig_rows[x] for x in segs[0].ys],
+                                              'matrices': {}}))
+                run = []
+
+            if entries is None:
+                break
+
+            signal, block, yi, p, dynamic = entries[0]
+            if block is blocks.lim_block:
+                self.plan.append(('LIM', self.sig_rows[signal], yi[0], self.sig_rows[yi[1]],
+                                  np.array([entry[3][0] for entry in entries]),
+                                  np.array([entry[3][1] for entry in entries])))
+            else:
+                # Constant factors of each instance are multiplied into one coefficient array
+                coef = np.array([np.prod([c for c, x in entry[2] if x is None] or [1.0]) for entry in entries])
+                coef = coef * np.prod([c for c, x in yi if x is not None] or [1.0])
+                self.plan.append(('MULT', self.sig_rows[signal], coef, [self.sig_rows[x] for c, x in yi if x is not None]))
+
+    def solve_step(self, h, dstep):
+        """
+        Solve all controllers in the bank for the next time step
+        """
+        if self.opt == 'runge_kutta' and dstep in [0,1]:
+            # Halve the step size for 1st and 2nd steps of 4th order Runge-Kutta method
+            h = h / 2
+
+        S = self.signals
+        for entry in self.plan:
+            if entry[0] == 'SEGMENT':
+                self.solve_segment(entry[1], h, dstep)
+
+            elif entry[0] == 'LIM':
+                S[entry[1]] = np.clip(entry[2] * S[entry[3]], entry[4], entry[5])
+
+            else:
+                S[entry[1]] = entry[2] * np.prod(S[entry[3]], axis=0)
+
+    def solve_segment(self, seg, h, dstep):
+        """
+        Solve a stacked linear segment: [yo; x1; f] = M_i(h) * [x0; u; 1] for every instance i
+        """
+        if h not in seg['matrices']:
+            seg['matrices'][h] = np.stack([s.build(h) for s in seg['segs']])
+
+        S = self.signals
+        X = self.states
+        ny = len(seg['ys'])
+        nx = len(seg['xs'])
+
+        x0 = X[seg['xs']]
+        z = np.vstack((x0, S[seg['us']], np.ones((1, S.shape[1]))))
+        out = np.einsum('ijk,ki->ji', seg['matrices'][h], z)
+
+        S[seg['ys']] = out[:ny]
+
+        if nx == 0:
+            return
+
+        x1 = out[ny:ny + nx]
+        f = out[ny + nx:]
+        if self.opt == 'mod_euler':
+            if dstep == 0:
+                seg['k'] = [f]
+            elif dstep == 1:
+                x1 = x1 - h * seg['k'][0]
+            else:
+                return
+
+        elif self.opt == 'runge_kutta':
+            if dstep == 0:
+                seg['x0'] = x0
+                seg['k'] = [f * 2 * h]
+            elif dstep == 1:
+                seg['k'].append(f * 2 * h)
+            elif dstep == 2:
+                seg['k'].append(f * h)
+            elif dstep == 3:
+                k = seg['k']
+                x1 = seg['x0'] + 1/6 * (k[0] + 2*k[1] + 2*k[2] + f * h)
+
+        X[seg['xs']] = x1
+
+
+class bank_view(MutableMapping):
+    """
+    Dictionary view of one controller (column) in the signal or state array of a controller bank
+    """
+    def __init__(self, values, rows, col):
+        self.values = values
+        self.rows = rows
+        self.col = col
+
+    def __getitem__(self, key):
+        return float(self.values[self.rows[key], self.col])
+
+    def __setitem__(self, key, value):
+        self.values[self.rows[key], self.col] = value
+
+    def __delitem__(self, key):
+        raise KeyError('Cannot remove "' + key + '" from a controller bank')
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
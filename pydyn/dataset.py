@@ -0,0 +1,173 @@
+#!python3
+#
+# Copyright (C) 2014-2015 Julius Susanto. All rights reserved.
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file.
+
+"""
+PYPOWER-Dynamics
+Dataset Store
+Consolidated on-disk store of simulated samples and a memory-mapped reader
+
+A store is a directory holding three files:
+    header.txt          Store description (dtype and channel names)
+    trajectories.bin    Fixed-dtype trajectory blocks (one row per time step, one column per channel)
+    index.bin           Offset index and metadata table (one record per sample)
+"""
+
+import os
+import numpy as np
+
+# Record layout of the offset index / metadata table
+INDEX_DTYPE = np.dtype([('offset', '<i8'),      # first row of the sample in trajectories.bin
+                        ('n_steps', '<i8'),     # number of rows (time steps) of the sample
+                        ('branch', '<i4'),      # faulted branch (row in ppc["branch"])
+                        ('from_bus', '<i4'),    # from bus of faulted branch
+                        ('to_bus', '<i4'),      # to bus of faulted branch
+                        ('location', '<f8'),    # fault location along the branch (0..1)
+                        ('fault_time', '<f8'),  # fault inception time (s)
+                        ('clear_time', '<f8'),  # fault clearing time (s)
+                        ('stable', '<i1')])     # transient stability label
+
+
+class dataset_store:
+    def __init__(self, path, dtype='<f8'):
+        """
+        Open (or create) a dataset store in directory path
+        Trajectories are stored as dtype ('<f4' halves the store size). The delta encoding of
+        pydyn.encoding is not available in the store (its rows are memory-mapped with a fixed dtype),
+        use recorder.write_compact for delta encoded files of single runs
+        """
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.channels = None
+
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+        if os.path.isfile(os.path.join(path, 'header.txt')):
+            self.dtype, self.channels = read_header(path)
+
+        # Number of trajectory rows already in the store
+        self.n_rows = 0
+        if self.channels is not None:
+            self.n_rows = len(memmap_file(os.path.join(path, 'trajectories.bin'), self.dtype)) // len(self.channels)
+
+    def append(self, oRecord):
+        """
+        Append the recorded trajectories and fault description of a recorder object to the store
+        Returns the maximum absolute storage error of each channel
+        """
+        if oRecord.stability is None:
+            raise ValueError('Samples without a stability label (aborted runs) are not stored')
+
+        channels = ['time'] + [line[0] for line in oRecord.recordset]
+
+        if self.channels is None:
+            self.channels = channels
+            write_header(self.path, self.dtype, self.channels)
+        elif channels != self.channels:
+            raise ValueError('Recorder channels do not match the channels of dataset store "' + self.path + '"')
+
+        data = oRecord.to_array()
+
+        # Samples without a branch fault are stored with branch = -1
+        log = oRecord.ppc.get('fault_log', [-1, -1, -1, 0, 0, 0])
+        entry = np.zeros(1, dtype=INDEX_DTYPE)
+        entry['offset'] = self.n_rows
+        entry['n_steps'] = data.shape[0]
+        entry['branch'] = log[0]
+        entry['from_bus'] = log[1]
+        entry['to_bus'] = log[2]
+        entry['location'] = log[3]
+        entry['fault_time'] = log[4]
+        entry['clear_time'] = log[5]
+        entry['stable'] = oRecord.stability
+
+        block = np.ascontiguousarray(data, dtype=self.dtype)
+
+        # Trajectories are written before the index entry that points to them
+        with open(os.path.join(self.path, 'trajectories.bin'), 'ab') as f:
+            f.write(block.tobytes())
+        with open(os.path.join(self.path, 'index.bin'), 'ab') as f:
+            f.write(entry.tobytes())
+
+        self.n_rows = self.n_rows + data.shape[0]
+
+        return np.abs(block - data).max(axis=0) if data.shape[0] > 0 else np.zeros(data.shape[1])
+
+
+class dataset_reader:
+    def __init__(self, path):
+        """
+        Memory-map a dataset store in directory path (nothing is parsed or loaded up front)
+        """
+        self.path = path
+        self.dtype, self.channels = read_header(path)
+
+        self.index = memmap_file(os.path.join(path, 'index.bin'), INDEX_DTYPE)
+        self.data = memmap_file(os.path.join(path, 'trajectories.bin'), self.dtype).reshape(-1, len(self.channels))
+
+    def __len__(self):
+        return len(self.index)
+
+    def channel(self, name):
+        """
+        Returns the column of a channel in the trajectory blocks
+        """
+        return self.channels.index(name)
+
+    def sample(self, i):
+        """
+        Returns the trajectories (as a view of the memory map) and metadata record of sample i
+        """
+        entry = self.index[i]
+        offset = int(entry['offset'])
+
+        return self.data[offset:offset + int(entry['n_steps'])], entry
+
+    def minibatch(self, size, rng=None):
+        """
+        Returns a random minibatch of samples as a list of trajectory views and an array of metadata records
+        """
+        if rng is None:
+            rng = np.random.default_rng()
+
+        ids = rng.choice(len(self.index), size=min(size, len(self.index)), replace=False)
+
+        return [self.sample(i)[0] for i in ids], self.index[ids]
+
+
+def write_header(path, dtype, channels):
+    f = open(os.path.join(path, 'header.txt'), 'w')
+    f.write('# PYPOWER-Dynamics dataset store\n\n')
+    f.write('DTYPE = ' + dtype.str + '\n')
+    f.write('CHANNELS = ' + ','.join(channels) + '\n')
+    f.close()
+
+
+def read_header(path):
+    """
+    Parse a dataset store header and return the trajectory dtype and list of channels
+    """
+    f = open(os.path.join(path, 'header.txt'), 'r')
+
+    for line in f:
+        if line[0] != '#' and line.strip() != '':   # Ignore comments and blank lines
+            tokens = line.strip().split('=')
+            if tokens[0].strip() == 'DTYPE':
+                dtype = np.dtype(tokens[1].strip())
+            elif tokens[0].strip() == 'CHANNELS':
+                channels = [x.strip() for x in tokens[1].split(',')]
+
+    f.close()
+
+    return dtype, channels
+
+
+def memmap_file(filename, dtype):
+    # np.memmap cannot map an empty (or missing) file
+    if not os.path.isfile(filename) or os.path.getsize(filename) == 0:
+        return np.zeros(0, dtype=dtype)
+
+    return np.memmap(filename, dtype=dtype, mode='r')
@@ -0,0 +1,51 @@
+#!python3
+#
+# Copyright (C) 2014-2015 Julius Susanto. All rights reserved.
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file.
+
+"""
+PYPOWER-Dynamics
+Element State Mixin
+Snapshot, restore and clone of the signal and state dictionaries of the dynamic models
+
+"""
+
+import copy
+
+class element_state:
+    def snapshot(self):
+        """
+        Returns a copy of the element signals and states (between time steps)
+        """
+        return dict(self.signals), dict(self.states)
+
+    def restore(self, snapshot):
+        """
+        Restore element signals and states from a snapshot
+        Variables added after the snapshot (e.g. interfaced inputs) are removed
+        """
+        signals, states = snapshot
+        reset_mapping(self.signals, signals)
+        reset_mapping(self.states, states)
+
+    def clone(self):
+        """
+        Returns a copy of the element with its own signals and states (parameters are shared)
+        """
+        other = copy.copy(self)
+        other.signals, other.states = self.snapshot()
+        other.states0 = {}
+        other.dsteps = {}
+
+        return other
+
+
+def reset_mapping(target, values):
+    """
+    Replace the contents of a signal or state mapping
+    Controller bank views have a fixed set of variables and are only updated
+    """
+    if isinstance(target, dict):
+        target.clear()
+    target.update(values)
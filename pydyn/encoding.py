@@ -0,0 +1,140 @@
+#!python3
+#
+# Copyright (C) 2014-2015 Julius Susanto. All rights reserved.
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file.
+
+"""
+PYPOWER-Dynamics
+Compact Trajectory Encoding
+Storage encodings for recorded trajectories (time steps x channels) with reported error bounds
+
+Encodings:
+    float64     Lossless (no compression)
+    float32     Single precision
+    delta       Fixed-point quantisation with a per-channel step, delta encoding along
+                the time axis and zlib compression (max error per channel <= tol)
+
+The encoded trajectories are variable-length blobs, written per run by recorder.write_compact.
+The dataset store (pydyn.dataset) memory-maps fixed-dtype rows and only supports the float64 and
+float32 representations ('<f8' / '<f4'), not the delta encoding.
+"""
+
+import zlib
+import numpy as np
+
+ENCODINGS = ['float64', 'float32', 'delta']
+
+
+def encode(data, encoding='delta', tol=1e-5):
+    """
+    Encode a 2D array of trajectories (time steps x channels)
+    tol is the absolute error bound of the delta encoding (scalar or one value per channel)
+    Returns a dictionary with the encoded payload and the maximum absolute error of each channel
+    """
+    data = np.asarray(data, dtype=np.float64)
+    if encoding == 'delta' and np.any(np.asarray(tol) <= 0):
+        raise ValueError('Delta encoding requires a positive error bound (tol > 0)')
+
+    enc = {'encoding': encoding, 'shape': data.shape}
+
+    if encoding == 'float64':
+        enc['payload'] = data.tobytes()
+
+    elif encoding == 'float32':
+        enc['payload'] = data.astype('<f4').tobytes()
+
+    elif encoding == 'delta':
+        if not np.all(np.isfinite(data)):
+            raise ValueError('Delta encoding requires finite trajectories')
+
+        # Quantisation step of each channel (rounding error is at most half a step)
+        scale = 2 * np.broadcast_to(np.asarray(tol, dtype=np.float64), data.shape[1:]).copy()
+        base = data[0].copy() if data.shape[0] > 0 else np.zeros(data.shape[1])
+
+        # Channels are stored contiguously (channel-major) for better compression
+        q = np.round((data - base) / scale).astype(np.int64).T
+        d = np.diff(q, axis=1, prepend=0)
+        itype = int_type(d)
+
+        enc['base'] = base
+        enc['scale'] = scale
+        enc['itype'] = itype.str
+        enc['payload'] = zlib.compress(d.astype(itype).tobytes())
+
+    else:
+        raise ValueError('Unknown trajectory encoding "' + str(encoding) + '" (use one of ' + ', '.join(ENCODINGS) + ')')
+
+    enc['max_err'] = np.abs(decode(enc) - data).max(axis=0) if data.shape[0] > 0 else np.zeros(data.shape[1])
+
+    return enc
+
+
+def decode(enc):
+    """
+    Decode an encoded trajectory dictionary back to a 2D float64 array
+    """
+    shape = tuple(enc['shape'])
+
+    if enc['encoding'] == 'float64':
+        return np.frombuffer(enc['payload'], dtype='<f8').reshape(shape)
+
+    elif enc['encoding'] == 'float32':
+        return np.frombuffer(enc['payload'], dtype='<f4').reshape(shape).astype(np.float64)
+
+    elif enc['encoding'] == 'delta':
+        d = np.frombuffer(zlib.decompress(enc['payload']), dtype=np.dtype(enc['itype'])).reshape(shape[::-1])
+        q = np.cumsum(d, axis=1, dtype=np.int64).T
+
+        return q * enc['scale'] + enc['base']
+
+    raise ValueError('Unknown trajectory encoding "' + str(enc['encoding']) + '"')
+
+
+def write_encoded(filename, enc, columns=None):
+    """
+    Write an encoded trajectory dictionary (and optional channel names) to a .npz file
+    """
+    arrays = {'encoding': np.array(enc['encoding']),
+              'shape': np.array(enc['shape']),
+              'max_err': enc['max_err'],
+              'payload': np.frombuffer(enc['payload'], dtype=np.uint8)}
+
+    if enc['encoding'] == 'delta':
+        arrays['base'] = enc['base']
+        arrays['scale'] = enc['scale']
+        arrays['itype'] = np.array(enc['itype'])
+
+    if columns is not None:
+        arrays['columns'] = np.array(columns)
+
+    with open(filename, 'wb') as f:
+        np.savez(f, **arrays)
+
+
+def read_encoded(filename):
+    """
+    Read an encoded trajectory file and return the decoded trajectories and channel names (or None)
+    """
+    with np.load(filename) as f:
+        enc = {'encoding': str(f['encoding']), 'shape': tuple(f['shape']), 'payload': f['payload'].tobytes()}
+
+        if enc['encoding'] == 'delta':
+            enc['base'] = f['base']
+            enc['scale'] = f['scale']
+            enc['itype'] = str(f['itype'])
+
+        columns = list(f['columns']) if 'columns' in f else None
+
+    return decode(enc), columns
+
+
+def int_type(d):
+    # Smallest signed integer type that holds all deltas
+    lo = d.min() if d.size else 0
+    hi = d.max() if d.size else 0
+    for itype in [np.int8, np.int16, np.int32]:
+        if np.iinfo(itype).min <= lo and hi <= np.iinfo(itype).max:
+            return np.dtype(itype).newbyteorder('<')
+
+    return np.dtype('<i8')
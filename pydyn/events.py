@@ -8,11 +8,22 @@
 PYPOWER-Dynamics
 Events Class
 Sets up and handles events in the simulation
+
+Events act on the internal case of the simulation (see pypower ext2int), whose bus and branch rows
+are fixed for the whole run: branch faults use fault buses and split branches reserved up front
+(reserve_fault_slots), and branch faults, clearances and trips only change values of the rows
+(shunts, impedances, terminal buses and branch status), never the number of rows. Object IDs of
+branch, bus and load events are rows of the internal case (the rows of the case if all buses and
+branches are in service).
 """
 
 import numpy as np
 from pypower.idx_bus import BUS_I, BUS_TYPE, PD, QD, GS, BS, BUS_AREA, \
-    VM, VA, VMAX, VMIN, LAM_P, LAM_Q, MU_VMAX, MU_VMIN, REF
+    VM, VA, VMAX, VMIN, LAM_P, LAM_Q, MU_VMAX, MU_VMIN, REF, PQ, BASE_KV, ZONE
+from pypower.idx_brch import F_BUS, T_BUS, BR_R, BR_X, BR_B, BR_STATUS, ANGMIN, ANGMAX, QT
+
+# Shunt admittance of an unused (isolated) fault bus (pu), keeps the Ybus matrix non-singular
+UNUSED_FAULT_BUS_Y = 1.0
 
 class events:
     def __init__(self, filename):
@@ -78,22 +89,29 @@ class events:
                     Rf = float(self.event_stack[0][3])
                     Xf = float(self.event_stack[0][4])
                     location = float(self.event_stack[0][5])
-                    # print(ppc["branch"])
-                    # print(len(ppc["bus"]))
-                    branch = ppc["branch"][branch_id]
-
-                    ppc["branch"] = np.delete(ppc["branch"], branch_id, 0)
-                    # fbus, tbus, r, x, b, rateA, rateB, rateC, ratio, angle, status, angmin, angmax
-                    new_bus_id = int(len(ppc["bus"])+1)
-                    separated_branch1 = [branch[0], new_bus_id, branch[2]*location, branch[3]*location, branch[4]*location, branch[5], branch[6], branch[7], branch[8], branch[9], branch[10], branch[11], branch[12]]
-                    separated_branch2 = [new_bus_id, branch[1], branch[2] * (1-location), branch[3] * (1-location),
-                                         branch[4]*(1-location), branch[5], branch[6], branch[7], branch[8], branch[9], branch[10], branch[11], branch[12]]
-                    from_bus = ppc["bus"][int(branch[0]-1)]
-                    to_bus = ppc["bus"][int(branch[1]-1)]
+
+                    # Next free fault slot (fault bus and split branch rows)
+                    used = [f[2] for f in ppc["fault"]]
+                    free = [slot for slot in ppc["fault_slots"] if slot[1] not in used]
+                    if not free:
+                        raise ValueError('No free fault slot for the fault on branch ' + str(branch_id) + ' (see the fault_slots program option)')
+                    slot_branch, slot_bus = free[0]
+                    branch = ppc["branch"][branch_id].copy()
+
+                    # The faulted branch is split at the fault bus: its row becomes the section from the
+                    # from bus to the fault bus, and the split branch slot the section to the to bus
+                    ppc["branch"][branch_id, T_BUS] = slot_bus
+                    ppc["branch"][branch_id, [BR_R, BR_X, BR_B]] = branch[[BR_R, BR_X, BR_B]] * location
+                    ppc["branch"][slot_branch] = branch
+                    ppc["branch"][slot_branch, F_BUS] = slot_bus
+                    ppc["branch"][slot_branch, [BR_R, BR_X, BR_B]] = branch[[BR_R, BR_X, BR_B]] * (1 - location)
+
+                    from_bus = ppc["bus"][int(branch[F_BUS])]
+                    to_bus = ppc["bus"][int(branch[T_BUS])]
                     voltage_difference = complex(from_bus[VM], from_bus[VA]) - complex(to_bus[VM], to_bus[VA])
                     voltage = voltage_difference * location + complex(to_bus[VM], to_bus[VA])
 
-                    intermediate_bus = [new_bus_id, 1, 0, 0, 0, 0, 1, 1, 0, 345, 1, 1.06, 0.94]
+                    intermediate_bus = [slot_bus, 1, 0, 0, 0, 0, 1, 1, 0, 345, 1, 1.06, 0.94]
                     intermediate_bus[7] = np.sqrt(voltage.real ** 2 + voltage.imag ** 2)
                     intermediate_bus[8] = np.arctan(voltage.imag/voltage.real) * 180 / np.pi
 
@@ -112,12 +130,12 @@ class events:
                         Xf = 'Inf'
                     else:
                         intermediate_bus[BS] = -1 / Xf * baseMVA
-                    ppc["fault"].append([branch_id, len(ppc["branch"]), len(ppc["bus"])])
-                    ppc['fault_log'] = [branch_id, branch[0], branch[1], location, self.event_stack[0][0], self.event_stack[0][0], '三相短路', '']
-                    ppc["branch"] = np.insert(ppc["branch"], branch_id, [separated_branch1], axis=0)
-                    ppc["branch"] = np.append(ppc["branch"], [separated_branch2], axis=0)
+                    ppc["bus"][slot_bus, :len(intermediate_bus)] = intermediate_bus
 
-                    ppc["bus"] = np.append(ppc["bus"], [intermediate_bus], axis=0)
+                    # Fault log with the bus numbers of the case
+                    i2e = ppc["order"]["bus"]["i2e"]
+                    ppc["fault"].append([branch_id, slot_branch, slot_bus])
+                    ppc['fault_log'] = [branch_id, i2e[int(branch[F_BUS])], i2e[int(branch[T_BUS])], location, self.event_stack[0][0], self.event_stack[0][0], '三相短路', '']
                     refactorise = True
                     print('FAULT event at t=' + str(t) + 's on branch at row "' + str(
                         branch_id) + '" with fault impedance Zf = ' + str(Rf) + ' + j' + str(Xf) + ' pu.')
@@ -158,7 +176,12 @@ class events:
 
                 if event_type == 'CLEAR_BRANCH_FAULT':
                     if flag:
-                        ppc["branch"] = np.insert(ppc["branch"], flag[1], flag[0],axis=0)
+                        # Reclose a tripped branch (a fault on it is cleared)
+                        ppc["branch"][flag[0], BR_STATUS] = 1
+                        for f in ppc["fault"]:
+                            if f[0] == flag[1]:
+                                ppc["bus"][f[2], BS] = 0
+                                ppc["bus"][f[2], GS] = 0
                         flag=None
                     else:
                         for f in ppc["fault"]:
@@ -168,19 +191,22 @@ class events:
                                 print('CLEAR_FAULT event at t=' + str(t) + 's on branch at row "' + str(
                                     int(self.event_stack[0][2])) + '".')
                     refactorise = True
-                    ppc['fault_log'][5] = self.event_stack[0][0]
+                    if 'fault_log' in ppc:
+                        ppc['fault_log'][5] = self.event_stack[0][0]
 
                 if event_type == 'TRIP_BRANCH':
                     branch_id = int(self.event_stack[0][2])
-                    if len(ppc["branch"]) != ppc["number_branch"]:
-                        ppc["branch"] = np.delete(ppc["branch"], -1, 0)
-                        ppc["branch"] = np.delete(ppc["branch"], -1, 0)
-                        ppc["bus"] = np.delete(ppc["bus"],-1, 0)
 
-                    else:
-                        ppc["branch"] = np.delete(ppc["branch"],branch_id, 0)
+                    # Both sections of a faulted branch are opened, its isolated fault bus is switched out
+                    rows = [branch_id]
+                    for f in ppc["fault"]:
+                        if f[0] == branch_id:
+                            rows.append(f[1])
+                            ppc["bus"][f[2], GS] = UNUSED_FAULT_BUS_Y * baseMVA
+                            ppc["bus"][f[2], BS] = 0
+                    ppc["branch"][rows, BR_STATUS] = 0
                     refactorise = True
-                    flag = [ppc["branch"][branch_id], branch_id]
+                    flag = [rows, branch_id]
                     
                     print('TRIP_BRANCH event at t=' + str(t) + 's on branch "' + str(branch_id) + '".')
                 
@@ -200,6 +226,43 @@ class events:
                 
         return ppc, refactorise, flag
 
+def reserve_fault_slots(ppc, n_slots=1):
+    """
+    Reserve the fault bus and split branch rows of n_slots branch faults in an internal case (see
+    pypower ext2int), and the branch flow columns (PF, QF, PT, QT)
+    Unused fault buses are isolated buses with a shunt admittance of UNUSED_FAULT_BUS_Y, unused split
+    branches are out of service. The slots are listed in ppc["fault_slots"] as [branch row, bus row]
+    """
+    nb = ppc["bus"].shape[0]
+    nl = ppc["branch"].shape[0]
+
+    if ppc["branch"].shape[1] < QT + 1:
+        ppc["branch"] = np.c_[ppc["branch"], np.zeros((nl, QT + 1 - ppc["branch"].shape[1]))]
+
+    buses = np.zeros((n_slots, ppc["bus"].shape[1]))
+    buses[:, BUS_I] = np.arange(nb, nb + n_slots)
+    buses[:, BUS_TYPE] = PQ
+    buses[:, GS] = UNUSED_FAULT_BUS_Y * ppc["baseMVA"]
+    buses[:, BUS_AREA] = 1
+    buses[:, VM] = 1
+    buses[:, BASE_KV] = 345
+    buses[:, ZONE] = 1
+    buses[:, VMAX] = 1.06
+    buses[:, VMIN] = 0.94
+
+    branches = np.zeros((n_slots, ppc["branch"].shape[1]))
+    branches[:, F_BUS] = np.arange(nb, nb + n_slots)
+    branches[:, T_BUS] = np.arange(nb, nb + n_slots)
+    branches[:, BR_X] = 1
+    branches[:, ANGMIN] = -360
+    branches[:, ANGMAX] = 360
+
+    ppc["bus"] = np.vstack((ppc["bus"], buses))
+    ppc["branch"] = np.vstack((ppc["branch"], branches))
+    ppc["fault_slots"] = [[nl + k, nb + k] for k in range(n_slots)]
+
+    return ppc
+
 def complex(VM, VA):
     return VM*np.cos(VA/180*np.pi) + 1j *VM * np.sin(VA/180*np.pi)
 
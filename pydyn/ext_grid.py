@@ -12,8 +12,10 @@ and two differential equations representing the swing equations.
 """
 
 import numpy as np
+from pydyn.registry import register_model
+from pydyn.element_state import element_state
 
-class ext_grid:
+class ext_grid(element_state):
     def __init__(self, ID, gen_no, Xdp, H, dynopt):
         self.id = ID
         self.gen_no = gen_no
@@ -122,6 +124,6 @@ class ext_grid:
             elif dstep == 3:
                 self.states['omega'] = self.states0['omega'] + 1/6 * (self.dsteps['omega'][0] + 2*self.dsteps['omega'][1] + 2*self.dsteps['omega'][2] + k_omega)
                 self.states['delta'] = self.states0['delta'] + 1/6 * (self.dsteps['delta'][0] + 2*self.dsteps['delta'][1] + 2*self.dsteps['delta'][2] + k_delta)
-        
-    
-    
\ No newline at end of file
+
+
+register_model(ext_grid, 'gen', lambda element: 1 / (1j * element.params['Xdp']))
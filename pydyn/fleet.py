@@ -0,0 +1,199 @@
+#!python3
+#
+# Copyright (C) 2014-2015 Julius Susanto. All rights reserved.
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file.
+
+"""
+PYPOWER-Dynamics
+Machine Fleet Class
+Reads the parameters of many machines from a single fleet file into arrays and instantiates the
+dynamic model objects
+
+A fleet file is a comma separated table with one row per machine (lines starting with # are comments):
+
+    MODEL, ID, GEN_NO, BUS_NO, MVA_Rating, Ra, Xd, ...
+    sym_order4, GEN1, 0, , 100, 0.0, 0.1, ...
+
+MODEL is the model class, GEN_NO (generators) or BUS_NO (motors) the row of the machine in the
+load flow case, and the remaining columns are machine parameters as in the machine files (*.mach,
+*.mot). Empty cells are parameters that the machine does not use.
+
+The parsed table is cached in a binary file next to the fleet file (filename + '.npz'), which is
+reused while the modification time or the hash of the fleet file is unchanged.
+"""
+
+import os
+import hashlib
+import numpy as np
+from pydyn.sym_order4 import sym_order4
+from pydyn.sym_order6a import sym_order6a
+from pydyn.sym_order6b import sym_order6b
+from pydyn.asym_1cage import asym_1cage
+from pydyn.asym_2cage import asym_2cage
+
+# Model classes that can be instantiated from a fleet file
+FLEET_MODELS = {'sym_order4': sym_order4,
+                'sym_order6a': sym_order6a,
+                'sym_order6b': sym_order6b,
+                'asym_1cage': asym_1cage,
+                'asym_2cage': asym_2cage}
+
+
+class fleet:
+    def __init__(self, filename, cache=True):
+        """
+        Read a fleet file (or its parse cache)
+        """
+        self.filename = filename
+        self.models = []
+        self.ids = []
+        self.columns = []
+        self.values = np.zeros((0, 0))
+
+        if cache:
+            self.load(filename)
+        else:
+            with open(filename, 'rb') as f:
+                self.parser(f.read())
+
+    def load(self, filename):
+        """
+        Load the fleet from its parse cache if the fleet file is unchanged, otherwise parse it and rewrite the cache
+        """
+        cache_file = filename + '.npz'
+        mtime = os.stat(filename).st_mtime_ns
+
+        # Modification time and hash of the fleet file the cache was written from
+        cached = None
+        if os.path.isfile(cache_file):
+            with np.load(cache_file) as f:
+                cached = dict((x, f[x]) for x in f.files)
+            if int(cached['mtime']) == mtime:
+                self.from_cache(cached)
+                return
+
+        with open(filename, 'rb') as f:
+            data = f.read()
+        digest = hashlib.sha1(data).hexdigest()
+
+        if cached is not None and str(cached['hash']) == digest:
+            # File touched but not modified
+            self.from_cache(cached)
+        else:
+            self.parser(data)
+
+        try:
+            with open(cache_file, 'wb') as f:
+                np.savez(f, mtime=mtime, hash=digest, models=np.array(self.models), ids=np.array(self.ids),
+                         columns=np.array(self.columns), values=self.values)
+        except OSError:
+            print('Warning: could not write fleet parse cache "' + cache_file + '"...')
+
+    def from_cache(self, cached):
+        self.models = cached['models'].tolist()
+        self.ids = cached['ids'].tolist()
+        self.columns = cached['columns'].tolist()
+        self.values = cached['values']
+
+    def parser(self, data):
+        """
+        Parse the contents of a fleet file into lists of models and IDs and a 2D array of parameters
+        (one row per machine, one column per parameter, NaN for empty cells)
+        """
+        header = None
+        rows = []
+        for line in data.decode().splitlines():
+            if line.strip() == '' or line.strip()[0] == '#':   # Ignore comments and blank lines
+                continue
+
+            tokens = [x.strip() for x in line.split(',')]
+            if header is None:
+                header = tokens
+                if header[:2] != ['MODEL', 'ID']:
+                    raise ValueError('Fleet file "' + self.filename + '" must start with the MODEL and ID columns')
+                continue
+
+            if len(tokens) != len(header):
+                raise ValueError('Wrong number of columns in fleet file "' + self.filename + '" for machine ' + tokens[1])
+
+            if tokens[0] not in FLEET_MODELS:
+                raise ValueError('Unknown model "' + tokens[0] + '" in fleet file "' + self.filename + '"')
+
+            self.models.append(tokens[0])
+            self.ids.append(tokens[1])
+            rows.append(tokens[2:])
+
+        self.columns = header[2:] if header is not None else []
+        self.values = np.array([[float(x) if x != '' else np.nan for x in row] for row in rows], dtype=float).reshape(-1, len(self.columns))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def column(self, name):
+        """
+        Returns the array of a parameter over all machines (NaN where not used)
+        """
+        return self.values[:, self.columns.index(name)]
+
+    def params(self, i):
+        """
+        Returns the dictionary of parameters of machine i (including ID and GEN_NO / BUS_NO)
+        """
+        params = dict((x, value) for x, value in zip(self.columns, self.values[i].tolist()) if not np.isnan(value))
+        params['ID'] = self.ids[i]
+
+        return params
+
+    def elements(self, dynopt):
+        """
+        Instantiate the dynamic model objects of the fleet
+        Returns a dictionary of elements with Object ID as key
+        """
+        elements = {}
+        for i in range(len(self.ids)):
+            element = FLEET_MODELS[self.models[i]](None, dynopt, self.params(i))
+            elements[element.id] = element
+
+        return elements
+
+
+def write_fleet(filename, machine_files, models):
+    """
+    Write a fleet file from a list of machine files (*.mach, *.mot) and their model class names
+    """
+    rows = []
+    columns = []
+    for machine_file, model in zip(machine_files, models):
+        row = read_machine_file(machine_file)
+        rows.append((model, row))
+        for x in row:
+            if x != 'ID' and x not in columns:
+                columns.append(x)
+
+    # Machine numbers first
+    columns = [x for x in ['GEN_NO', 'BUS_NO'] if x in columns] + [x for x in columns if x not in ['GEN_NO', 'BUS_NO']]
+
+    f = open(filename, 'w')
+    f.write('# PYPOWER-Dynamics machine fleet\n\n')
+    f.write(','.join(['MODEL', 'ID'] + columns) + '\n')
+    for model, row in rows:
+        f.write(','.join([model, row['ID']] + [row.get(x, '') for x in columns]) + '\n')
+    f.close()
+
+
+def read_machine_file(filename):
+    """
+    Returns the raw (unconverted) parameters of a machine file as a dictionary of strings
+    """
+    row = {}
+    f = open(filename, 'r')
+
+    for line in f:
+        if line[0] != '#' and line.strip() != '':   # Ignore comments and blank lines
+            tokens = line.strip().split('=')
+            row[tokens[0].strip()] = tokens[1].strip()
+
+    f.close()
+
+    return row
@@ -10,11 +10,13 @@ Functions for the interface between controller and machine variables
 
 """
 
+from pydyn.registry import model_kind
+
 def init_interfaces(elements):
     ints_list = []
     
     for element in elements.values():
-        if element.__module__ == 'pydyn.controller':
+        if model_kind(element) == 'controller':
             for line in element.equations:
                 if line[1] == 'INPUT':
                     new_int = [line[1],line[2],elements[line[3]],element]
@@ -24,4 +26,4 @@ def init_interfaces(elements):
                     new_int = [line[1],line[0],element,elements[line[3]]]
                     ints_list.append(new_int)
     
-    return ints_list
\ No newline at end of file
+    return ints_list
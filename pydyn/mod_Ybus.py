@@ -11,33 +11,26 @@ Build modified Ybus matrix
 """
 
 import numpy as np
+from scipy.sparse import diags
+from pydyn.registry import element_table
 from pypower.idx_bus import BUS_I, BUS_TYPE, PD, QD, GS, BS, BUS_AREA, \
     VM, VA, VMAX, VMIN, LAM_P, LAM_Q, MU_VMAX, MU_VMIN, REF
 
 
-def mod_Ybus(Ybus, elements, bus, gen, baseMVA):
-    # Add equivalent generator and grid admittances to Ybus matrix
-    for element in elements.values():
-        Ye = 0
-        
-        # 4th/6th order machines and converters
-        if element.__module__ in ['pydyn.sym_order4', 'pydyn.sym_order6a', 'pydyn.sym_order6b', 'pydyn.vsc_average']:
-            i = gen[element.gen_no,0].astype(int)
-            Ye = element.Yg
-        
-        # External grid
-        if element.__module__ == 'pydyn.ext_grid':
-            i = gen[element.gen_no,0].astype(int)
-            Ye = 1 / (1j * element.params['Xdp'])
-        
-        if Ye != 0:
-            Ybus[i,i] = Ybus[i,i] + Ye
+def mod_Ybus(Ybus, elements, bus, gen, baseMVA, table=None):
+    """
+    Add equivalent generator, grid and load admittances to the diagonal of the Ybus matrix
+    table is the element table of the elements (built here if not given)
+    """
+    if table is None:
+        table = element_table(elements, {'bus': bus, 'gen': gen})
+    
+    # Equivalent source admittances (registered with each model class)
+    Ybus = Ybus + diags(table.admittances(bus.shape[0]), format='csr')
 
-    # Add equivalent load admittance to Ybus matrix    
-    Pl, Ql = bus[:, PD], bus[:, QD]
-    for i in range(len(Pl)):
-        S_load = (Pl[i] - 1j * Ql[i]) / baseMVA
-        y_load = S_load / (bus[i, VM] ** 2)
-        Ybus[i,i] = Ybus[i,i] + y_load
+    # Add equivalent load admittance to Ybus matrix
+    S_load = (bus[:, PD] - 1j * bus[:, QD]) / baseMVA
+    y_load = S_load / (bus[:, VM] ** 2)
+    Ybus = Ybus + diags(y_load, format='csr')
     
-    return Ybus
\ No newline at end of file
+    return Ybus
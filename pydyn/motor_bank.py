@@ -0,0 +1,225 @@
+#!python3
+#
+# Copyright (C) 2014-2015 Julius Susanto. All rights reserved.
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file.
+
+"""
+PYPOWER-Dynamics
+Induction Motor Bank Class
+N single cage (asym_1cage) and double cage (asym_2cage) asynchronous machines held as arrays,
+with vectorised current injections and state derivatives. The bank is a single source
+attached to many buses.
+
+Model equations based on section 15.2.4 of:
+Milano, F., "Power System Modelling and Scripting", Springer-Verlag, 2010
+
+"""
+
+import numpy as np
+import copy
+from pydyn.registry import register_model
+from pydyn.asym_2cage import asym_2cage
+
+# Rows of the state array
+EQP, EDP, EQPP, EDPP, S = range(5)
+STATES = ['Eqp', 'Edp', 'Eqpp', 'Edpp', 's']
+
+
+class motor_bank:
+    def __init__(self, ID, motors, dynopt):
+        """
+        Build a motor bank from a list of parsed asym_1cage / asym_2cage objects
+        Single cage motors are represented as double cage motors with identical transient and
+        subtransient states (no subtransient dynamics)
+        """
+        self.id = ID
+        self.opt = dynopt['iopt']
+        self.omega_n = 2 * np.pi * dynopt['fn']
+        self.motor_ids = [motor.id for motor in motors]
+        self.bus_no = np.array([motor.bus_no for motor in motors], dtype=int)
+
+        n = len(motors)
+        self.double = np.array([isinstance(motor, asym_2cage) for motor in motors], dtype=float)
+        self.params = {}
+        for p in ['Rs', 'X0', 'Xp', 'T0p', 'H', 'a']:
+            self.params[p] = np.array([motor.params[p] for motor in motors], dtype=float)
+        self.params['Xpp'] = np.array([motor.params['Xpp'] if d else motor.params['Xp'] for motor, d in zip(motors, self.double)])
+        self.params['T0pp'] = np.array([motor.params['T0pp'] if d else 1.0 for motor, d in zip(motors, self.double)])
+        self.base_mva = np.array([motor.base_mva for motor in motors], dtype=float)
+
+        # Motors of the bank can be enabled individually (the start signal applies to all enabled motors)
+        self.enabled = np.ones(n, dtype=bool)
+
+        self.signals = {}
+        self.states = np.zeros((5, n))
+        self.states0 = None
+        self.dsteps = []
+
+        # Motor start signal
+        self.signals['start'] = 0
+
+    def active(self):
+        """
+        Returns a boolean array of running motors
+        """
+        return self.enabled & (self.signals['start'] == 1)
+
+    def initialise(self, vt0, S0):
+        """
+        Initialise motor signals and states (at standstill) from the load flow voltages at the motor buses
+        """
+        n = len(self.bus_no)
+        self.states = np.zeros((5, n))
+        self.states[S] = 1
+
+        for x in ['Id', 'Iq', 'Vd', 'Vq', 'P', 'Q', 'Te', 'Im']:
+            self.signals[x] = np.zeros(n)
+        self.signals['Vt'] = np.abs(vt0)
+        self.signals['omega'] = 1 - self.states[S]
+
+    def calc_tmech(self, s):
+        """
+        Calculate mechanical load torque (with a quadratic load model)
+        """
+        return self.params['a'] * (1 - s) ** 2
+
+    def calc_currents(self, vt):
+        """
+        Calculate motor current injections (in network reference frame) for an array of terminal voltages
+        """
+        active = self.active()
+        if not active.any():
+            return np.zeros(len(vt), dtype=complex)
+
+        # Calculate terminal voltage in dq reference frame (set to rotate with q-axis)
+        Vd = -np.abs(vt) * np.sin(np.angle(vt))
+        Vq = np.abs(vt) * np.cos(np.angle(vt))
+
+        # Calculate Id and Iq (Norton equivalent current injection in dq frame)
+        Eqpp = self.states[EQPP]
+        Edpp = self.states[EDPP]
+        Rs = self.params['Rs']
+        Xpp = self.params['Xpp']
+
+        Iq = (Rs / Xpp * (Vq - Eqpp) - Vd + Edpp) / (Xpp + Rs ** 2 / Xpp)
+        Id = (Vq - Eqpp - Rs * Iq) / Xpp
+
+        # Calculate power output and electrical torque
+        p = -(Vd * Id + Vq * Iq)
+        q = -(Vq * Id - Vd * Iq)
+        Te = (Edpp * Id + Eqpp * Iq)
+
+        # Calculate motor current injection (Norton equivalent current injection in network frame)
+        In = (Iq - 1j * Id)
+        Im = np.where(active, -In * self.base_mva / 100, 0)
+
+        # Update signals of running motors
+        for x, value in [('Id', Id), ('Iq', Iq), ('Vd', Vd), ('Vq', Vq), ('Te', Te), ('P', p), ('Q', q),
+                         ('Im', np.abs(Im)), ('Vt', np.abs(vt)), ('Vang', np.angle(vt)), ('omega', 1 - self.states[S])]:
+            if x in self.signals:
+                self.signals[x] = np.where(active, value, self.signals[x])
+            else:
+                self.signals[x] = np.where(active, value, 0)
+
+        return Im
+
+    def solve_step(self, h, dstep):
+        """
+        Solve motor differential equations for the next stage in the integration step
+        """
+        active = self.active()
+        if not active.any():
+            return
+
+        x0 = self.states
+        Eqp_0, Edp_0, Eqpp_0, Edpp_0, s_0 = x0
+
+        Xp = self.params['Xp']
+        Xpp = self.params['Xpp']
+        X0 = self.params['X0']
+        T0p = self.params['T0p']
+        T0pp = self.params['T0pp']
+
+        Id = self.signals['Id']
+        Iq = self.signals['Iq']
+        Te = self.signals['Te']
+
+        w = self.omega_n / np.pi
+        f = np.empty_like(x0)
+
+        # Electrical differential equations
+        f[EQP] = w * (-s_0 * Edp_0 - (Eqp_0 - (X0 - Xp) * Id) / T0p)
+        f[EDP] = w * (s_0 * Eqp_0 - (Edp_0 + (X0 - Xp) * Iq) / T0p)
+        f[EQPP] = f[EQP] + self.double * w * (s_0 * (Edp_0 - Edpp_0) + (Eqp_0 - Eqpp_0 + (Xp - Xpp) * Id) / T0pp)
+        f[EDPP] = f[EDP] + self.double * w * (-s_0 * (Eqp_0 - Eqpp_0) + (Edp_0 - Edpp_0 - (Xp - Xpp) * Iq) / T0pp)
+
+        # Mechanical equation
+        f[S] = (self.calc_tmech(s_0) - Te) / (2 * self.params['H'])
+
+        # Stopped motors keep their states
+        k = h * f * active
+
+        if self.opt == 'mod_euler':
+            # Modified Euler
+            if dstep == 0:
+                # Predictor step
+                self.states = x0 + k
+                self.dsteps = [k]
+            elif dstep == 1:
+                # Corrector step
+                self.states = x0 + 0.5 * (k - self.dsteps[0])
+
+        elif self.opt == 'runge_kutta':
+            # 4th Order Runge-Kutta Method
+            if dstep == 0:
+                # Save initial states
+                self.states0 = x0
+                self.states = x0 + 0.5 * k
+                self.dsteps = [k]
+            elif dstep == 1:
+                self.states = x0 + 0.5 * k
+                self.dsteps.append(k)
+            elif dstep == 2:
+                self.states = x0 + k
+                self.dsteps.append(k)
+            elif dstep == 3:
+                self.states = self.states0 + 1/6 * (self.dsteps[0] + 2*self.dsteps[1] + 2*self.dsteps[2] + k)
+
+    def snapshot(self):
+        """
+        Returns a copy of the bank signals, states and enabled motors (between time steps)
+        """
+        signals = dict((x, np.copy(value)) for x, value in self.signals.items())
+        
+        return signals, self.states.copy(), self.enabled.copy()
+    
+    def restore(self, snapshot):
+        """
+        Restore bank signals, states and enabled motors from a snapshot
+        """
+        signals, states, enabled = snapshot
+        self.signals.clear()
+        self.signals.update((x, np.copy(value)) for x, value in signals.items())
+        self.states = states.copy()
+        self.enabled = enabled.copy()
+    
+    def clone(self):
+        """
+        Returns a copy of the bank with its own signals and states (parameter arrays are shared)
+        """
+        other = copy.copy(self)
+        other.signals, other.states, other.enabled = self.snapshot()
+        other.states0 = None
+        other.dsteps = []
+        
+        return other
+    
+    def motor_states(self, i):
+        """
+        Returns a dictionary of the state variables of motor i
+        """
+        return dict((x, self.states[j, i]) for j, x in enumerate(STATES))
+
+
+register_model(motor_bank, 'bus')
@@ -0,0 +1,266 @@
+#!python3
+#
+# Copyright (C) 2014-2015 Julius Susanto. All rights reserved.
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file.
+
+"""
+PYPOWER-Dynamics
+Operating Point Sampler Class
+Solves the power flows of a case over load and generation scalings with warm-started Newton-Raphson
+iterations (predictor-corrector continuation) instead of a flat start for every operating point
+
+An operating point (load_scale, gen_scale) multiplies the bus loads PD and QD by load_scale and the
+generator set points PG by gen_scale (the slack generator takes up the balance). Every point is
+corrected by Newton-Raphson iterations from a predicted state: a secant extrapolation from the two
+nearest solved points (or the nearest solved point if only one is known), with a retry from the
+nearest solved point if the predicted start fails. Solved states are cached and used for the
+following points; points that are at least as loaded as a known infeasible point (with the same
+generation scaling) are rejected without iterations.
+
+Nose proximity:
+    nose_index  Smallest singular value of the power flow Jacobian at the solution, relative to the
+                base case (1 at the base case, approaching 0 at the nose of the PV curve)
+
+The solved operating points are returned as PYPOWER cases (with the solved bus voltages and
+generator outputs), e.g. for sample.criticalSample.
+"""
+
+import copy
+import numpy as np
+from time import perf_counter
+from scipy.sparse import hstack, vstack
+from scipy.sparse.linalg import splu
+from pypower.ext2int import ext2int
+from pypower.int2ext import int2ext
+from pypower.makeYbus import makeYbus
+from pypower.makeSbus import makeSbus
+from pypower.bustypes import bustypes
+from pypower.dSbus_dV import dSbus_dV
+from pypower.pfsoln import pfsoln
+from pypower.idx_bus import PD, QD, VM, VA, VMAX, VMIN
+from pypower.idx_gen import GEN_BUS, PG, VG, GEN_STATUS
+from pypower.idx_brch import QT
+from pydyn.synthetic import bookkeeping
+
+
+class operating_point_sampler:
+    def __init__(self, ppc, max_it=10, tol=1e-8):
+        """
+        Set up the sampler for a case and solve its base operating point (load_scale = gen_scale = 1)
+
+        Inputs:
+            ppc         PYPOWER case
+            max_it      Maximum number of Newton-Raphson iterations per operating point
+            tol         Tolerance of the power mismatches (pu)
+        """
+        self.max_it = max_it
+        self.tol = tol
+
+        # Branch flow columns are added to the case (as in runpf), and removed from the solved cases
+        # (events expect the columns of the original case)
+        ppc = copy.deepcopy(ppc)
+        self.branch_cols = ppc["branch"].shape[1]
+        if ppc["branch"].shape[1] < QT + 1:
+            ppc["branch"] = np.c_[ppc["branch"], np.zeros((ppc["branch"].shape[0], QT + 1 - ppc["branch"].shape[1]))]
+        self.ppc_int = ext2int(ppc)
+        baseMVA, bus, gen, branch = self.ppc_int["baseMVA"], self.ppc_int["bus"], self.ppc_int["gen"], self.ppc_int["branch"]
+        self.Ybus, self.Yf, self.Yt = makeYbus(baseMVA, bus, branch)
+        self.ref, self.pv, self.pq = bustypes(bus, gen)
+        self.pvpq = np.r_[self.pv, self.pq]
+
+        # Initial state of the case, with the generator voltage set points at the generator buses
+        V0 = bus[:, VM] * np.exp(1j * np.radians(bus[:, VA]))
+        on = np.flatnonzero(gen[:, GEN_STATUS] > 0)
+        gbus = gen[on, GEN_BUS].astype(int)
+        V0[gbus] = gen[on, VG] / np.abs(V0[gbus]) * V0[gbus]
+
+        # Solved states (operating point -> bus voltages) and infeasible operating points
+        self.solved = {}
+        self.infeasible = []
+        self.sigma_base = None
+
+        base = self.correct((1.0, 1.0), V0, self.max_it * 2)
+        if not base['success']:
+            raise ValueError('The power flow of the base case did not converge')
+        self.sigma_base = base['sigma_min']
+
+    def sbus(self, point):
+        # Bus power injections of an operating point (pu)
+        bus = self.ppc_int["bus"].copy()
+        gen = self.ppc_int["gen"].copy()
+        bus[:, [PD, QD]] = bus[:, [PD, QD]] * point[0]
+        gen[:, PG] = gen[:, PG] * point[1]
+
+        return makeSbus(self.ppc_int["baseMVA"], bus, gen), bus, gen
+
+    def jacobian(self, V):
+        # Power flow Jacobian (angles of the PV and PQ buses, magnitudes of the PQ buses)
+        dS_dVm, dS_dVa = dSbus_dV(self.Ybus, V)
+        pvpq, pq = self.pvpq, self.pq
+        J11 = dS_dVa[pvpq, :][:, pvpq].real
+        J12 = dS_dVm[pvpq, :][:, pq].real
+        J21 = dS_dVa[pq, :][:, pvpq].imag
+        J22 = dS_dVm[pq, :][:, pq].imag
+
+        return vstack([hstack([J11, J12]), hstack([J21, J22])], format='csc')
+
+    def correct(self, point, V0, max_it):
+        """
+        Newton-Raphson iterations from V0 (the corrector)
+        Iterations stop early when the mismatch grows in two consecutive iterations
+        Returns a result dictionary (and caches the solved state)
+        """
+        Sbus = self.sbus(point)[0]
+        V = V0.copy()
+        Va = np.angle(V)
+        Vm = np.abs(V)
+        n_pvpq = len(self.pvpq)
+        norm_prev = np.inf
+        growing = 0
+        success = False
+
+        for i in range(max_it + 1):
+            mis = V * np.conj(self.Ybus * V) - Sbus
+            F = np.r_[mis[self.pvpq].real, mis[self.pq].imag]
+            norm = np.max(np.abs(F))
+            if norm < self.tol:
+                success = True
+                break
+            if i == max_it or not np.isfinite(norm):
+                break
+
+            growing = growing + 1 if norm > norm_prev else 0
+            if growing >= 2:
+                break
+            norm_prev = norm
+
+            dx = splu(self.jacobian(V)).solve(-F)
+            Va[self.pvpq] = Va[self.pvpq] + dx[:n_pvpq]
+            Vm[self.pq] = Vm[self.pq] + dx[n_pvpq:]
+            V = Vm * np.exp(1j * Va)
+
+        result = {'load_scale': point[0], 'gen_scale': point[1], 'success': success, 'iterations': i,
+                  'rejected': False, 'sigma_min': np.nan, 'nose_index': np.nan, 'within_limits': False}
+        if success:
+            self.solved[point] = V
+            result['sigma_min'] = self.sigma_min(V)
+            if self.sigma_base is not None:
+                result['nose_index'] = result['sigma_min'] / self.sigma_base
+            else:
+                result['nose_index'] = 1.0
+            bus = self.ppc_int["bus"]
+            result['within_limits'] = bool(np.all((np.abs(V) <= bus[:, VMAX] + 1e-6) & (np.abs(V) >= bus[:, VMIN] - 1e-6)))
+
+        return result
+
+    def sigma_min(self, V, n_iter=20):
+        """
+        Smallest singular value of the power flow Jacobian (inverse power iteration on J J^T)
+        """
+        lu = splu(self.jacobian(V))
+        x = np.ones(len(self.pvpq) + len(self.pq))
+        growth = 1.0
+        for i in range(n_iter):
+            z = lu.solve(lu.solve(x, trans='T'))
+            growth = np.linalg.norm(z) / np.linalg.norm(x)
+            x = z / np.linalg.norm(z)
+
+        return 1 / np.sqrt(growth)
+
+    def predict(self, point):
+        """
+        Predicted bus voltages of an operating point from the nearest solved points
+        Returns the prediction and the state of the nearest solved point
+        """
+        p = np.array(point)
+        known = sorted(self.solved, key=lambda x: np.sum((np.array(x) - p) ** 2))
+        a = np.array(known[0])
+        Va = np.angle(self.solved[known[0]])
+        Vm = np.abs(self.solved[known[0]])
+        if len(known) < 2:
+            return self.solved[known[0]], self.solved[known[0]]
+
+        # Secant predictor along the two nearest solved points (projection of the point on the secant)
+        b = np.array(known[1])
+        s = np.clip(np.dot(p - a, a - b) / np.dot(a - b, a - b), -1, 2)
+        Va_pred = Va + s * (Va - np.angle(self.solved[known[1]]))
+        Vm_pred = Vm + s * (Vm - np.abs(self.solved[known[1]]))
+
+        return Vm_pred * np.exp(1j * Va_pred), self.solved[known[0]]
+
+    def solve(self, load_scale, gen_scale=1.0):
+        """
+        Solve an operating point (points already solved are evaluated at their cached state)
+        Returns a result dictionary: load_scale, gen_scale, success, iterations, rejected, nose_index,
+        sigma_min, within_limits (bus voltages within VMIN..VMAX) and time (s)
+        """
+        t0 = perf_counter()
+        point = (float(load_scale), float(gen_scale))
+
+        # Quick rejection beyond a known infeasible point
+        for x in self.infeasible:
+            if x[1] == point[1] and x[0] <= point[0]:
+                return {'load_scale': point[0], 'gen_scale': point[1], 'success': False, 'iterations': 0,
+                        'rejected': True, 'sigma_min': np.nan, 'nose_index': np.nan, 'within_limits': False,
+                        'time': perf_counter() - t0}
+
+        if point in self.solved:
+            result = self.correct(point, self.solved[point], 0)
+        else:
+            V_pred, V_near = self.predict(point)
+            result = self.correct(point, V_pred, self.max_it)
+            if not result['success']:
+                # Corrector from the nearest solved state
+                retry = self.correct(point, V_near, self.max_it)
+                retry['iterations'] = retry['iterations'] + result['iterations']
+                result = retry
+            if not result['success']:
+                self.infeasible.append(point)
+
+        result['time'] = perf_counter() - t0
+
+        return result
+
+    def sample(self, points):
+        """
+        Solve a list of operating points ((load_scale, gen_scale) pairs)
+        Points are solved in order of their distance from the base case, so that every point is warm
+        started from nearby solutions. Returns the results in the order of points
+        """
+        order = sorted(range(len(points)), key=lambda i: (points[i][0] - 1) ** 2 + (points[i][1] - 1) ** 2)
+        results = [None] * len(points)
+        for i in order:
+            results[i] = self.solve(points[i][0], points[i][1])
+
+        return results
+
+    def case(self, result):
+        """
+        Returns the PYPOWER case of a solved operating point, with the solved bus voltages and generator
+        outputs
+        """
+        point = (result['load_scale'], result['gen_scale'])
+        if point not in self.solved:
+            raise ValueError('Operating point ' + str(point) + ' has not been solved')
+
+        Sbus, bus, gen = self.sbus(point)
+
+        return solved_case(self.ppc_int, bus, gen, self.Ybus, self.Yf, self.Yt, self.solved[point], self.ref, self.pv, self.pq,
+                           self.branch_cols)
+
+
+def solved_case(ppc_int, bus, gen, Ybus, Yf, Yt, V, ref, pv, pq, branch_cols):
+    """
+    Returns the PYPOWER case (external numbering) of a solved power flow of an internal case, with the
+    bus loads and generator set points of bus and gen and the bus voltages V
+    The branch flow columns are removed (events expect branch_cols columns as in the original case)
+    """
+    ppc_int = copy.deepcopy(ppc_int)
+    bus, gen, branch = pfsoln(ppc_int["baseMVA"], bus, gen, ppc_int["branch"], Ybus, Yf, Yt, V, ref, pv, pq)
+    ppc_int["bus"], ppc_int["gen"], ppc_int["branch"] = bus, gen, branch
+    ppc = int2ext(ppc_int)
+    ppc["branch"] = ppc["branch"][:, :branch_cols]
+    bookkeeping(ppc)
+
+    return ppc
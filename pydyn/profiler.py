@@ -0,0 +1,116 @@
+#!python3
+#
+# Copyright (C) 2014-2015 Julius Susanto. All rights reserved.
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file.
+
+"""
+PYPOWER-Dynamics
+Profiler Class
+Lightweight per-phase timing (monotonic clock) and event counters of simulation runs, with a
+summary that aggregates the profiles of a batch of runs
+
+Phases:
+    power_flow      Initial load flow (runpf)
+    ybus            ext2int, Ybus build and modification, element table
+    factorise       Ybus factorisation (splu)
+    initialise      Model initialisation, controller banks and interface binding
+    interfaces      Copying of unbound interface variables
+    solve_step      Element solve steps (differential equations)
+    solve_network   Network solution iterations
+    branch_flows    Bus voltages and branch flow computation
+    recorder        Recording of variables
+    events          Event handling (excluding the refactorisation)
+    output          Writing of recorded variables (recorder write methods)
+
+Counters:
+    runs, steps, refactorisations, network_iterations
+"""
+
+from time import perf_counter
+
+PHASES = ['power_flow', 'ybus', 'factorise', 'initialise', 'interfaces', 'solve_step', 'solve_network',
+          'branch_flows', 'recorder', 'events', 'output']
+
+
+class profiler:
+    def __init__(self):
+        self.times = dict((phase, 0.0) for phase in PHASES)
+        self.calls = dict((phase, 0) for phase in PHASES)
+        self.counters = {'runs': 0, 'steps': 0, 'refactorisations': 0, 'network_iterations': 0}
+
+    def add(self, phase, t0):
+        """
+        Add the time elapsed since t0 (from perf_counter) to a phase
+        Returns the current time, so that consecutive phases can be timed with one clock reading each
+        """
+        t1 = perf_counter()
+        self.times[phase] = self.times[phase] + t1 - t0
+        self.calls[phase] = self.calls[phase] + 1
+
+        return t1
+
+    def count(self, counter, n=1):
+        """
+        Increment an event counter
+        """
+        self.counters[counter] = self.counters.get(counter, 0) + n
+
+    def merge(self, other):
+        """
+        Add the times and counters of another profiler (e.g. the session setup, or other runs of a batch)
+        """
+        for phase in other.times:
+            self.times[phase] = self.times.get(phase, 0.0) + other.times[phase]
+            self.calls[phase] = self.calls.get(phase, 0) + other.calls[phase]
+        for counter in other.counters:
+            self.count(counter, other.counters[counter])
+
+        return self
+
+    def total(self):
+        return sum(self.times.values())
+
+    def report(self):
+        """
+        Returns a dictionary of phase times (s), calls and counters, with network iterations per step
+        """
+        report = {'times': dict(self.times), 'calls': dict(self.calls), 'counters': dict(self.counters), 'total': self.total()}
+        if self.counters['steps'] > 0:
+            report['network_iterations_per_step'] = self.counters['network_iterations'] / self.counters['steps']
+
+        return report
+
+    def summary(self):
+        """
+        Returns a text table of the phase times and counters
+        """
+        total = self.total()
+        lines = ['%-16s %10s %7s %10s %12s' % ('Phase', 'Time (s)', '%', 'Calls', 'Mean (ms)')]
+        for phase in self.times:
+            if self.calls[phase] == 0:
+                continue
+            share = 100 * self.times[phase] / total if total > 0 else 0
+            mean = 1000 * self.times[phase] / self.calls[phase]
+            lines.append('%-16s %10.4f %7.1f %10d %12.4f' % (phase, self.times[phase], share, self.calls[phase], mean))
+        lines.append('%-16s %10.4f' % ('total', total))
+
+        lines.append('')
+        for counter in self.counters:
+            lines.append('%-20s %d' % (counter, self.counters[counter]))
+        if self.counters['steps'] > 0:
+            lines.append('%-20s %.3f' % ('iterations per step', self.counters['network_iterations'] / self.counters['steps']))
+
+        return '\n'.join(lines)
+
+
+def merge_profiles(profiles):
+    """
+    Aggregate a list of profilers (e.g. the recorder profiles of a batch of runs) into one profiler
+    """
+    batch = profiler()
+    for prof in profiles:
+        if prof is not None:
+            batch.merge(prof)
+
+    return batch
@@ -5,9 +5,13 @@
 # license that can be found in the LICENSE file.
 
 
-import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
+import threading
+import gzip
+import queue
+from collections import deque
+import pydyn.encoding as codec
+from time import perf_counter
 
 
 """
@@ -25,6 +29,12 @@ class recorder:
         self.parser(filename)
         self.stability = False
         
+        # Timing profile of the simulation run (pydyn.profiler, set by the simulation)
+        self.profile = None
+
+        # Failure reason if the run was aborted by the watchdog (pydyn.watchdog, set by the simulation)
+        self.failure = None
+        
         for line in self.recordset:
             self.results[line[0]] = []   
             
@@ -53,6 +63,9 @@ class recorder:
                     for i in range(self.ppc["number_load"]):
                         self.recordset.append(
                             [tokens[0].strip() + str(i), tokens[1].strip(), str(i), tokens[2].strip()])
+                elif tokens[1].strip() == "NET":
+                    # Numerical health of the network solution (one channel per variable)
+                    self.recordset.append([tokens[0].strip(), tokens[1].strip(), '', tokens[2].strip()])
 
         f.close()
 
@@ -110,48 +123,139 @@ class recorder:
                 elif line[3] == "Q":
                     self.results[line[0]].append(v[int(line[2])][1])
 
-    def write_output(self, filename=None):
+    def record_net(self, health):
+        """
+        Records numerical health variables of the network solution during a simulation
+            iterations  Network iterations in the time step (all integration stages)
+            verr        Largest final voltage mismatch of the integration stages
+            nonconv     Number of integration stages in which the network solution did not converge
+            epoch       Topology epoch (number of Ybus refactorisations so far)
+            h           Step size (s)
+        """
+        for line in self.recordset:
+            if line[1] == 'NET':
+                self.results[line[0]].append(health[line[3]])
+
+    def close(self):
+        """
+        Finish recording (nothing to do for in-memory recording)
         """
-        Write recorded variables to file
-        (This method could be written in a more pythonic way...)
+        pass
+
+    def write_output(self, filename=None, columns=None, delimiter=',', compress=False, chunk_size=10000):
+        """
+        Write recorded variables to a delimited text file (CSV by default, delimiter='\\t' for TSV)
+        Rows are formatted in blocks of chunk_size time steps. A subset of channels can be selected
+        with columns. The file is gzip-compressed if compress is True or the filename ends in '.gz'
         """
         if filename != None:
-            header = 'time'
-            for line in self.recordset:
-                header = header + ',' + line[0]
-            
-            f = open(filename, 'w')
-            f.write(header + '\n')
-            
-            for i in range(len(self.t_axis)):
-                newline = str(self.t_axis[i])
-                for line in self.recordset:
-                    newline = newline + ',' + str(self.results[line[0]][i])
-                
-                f.write(newline + '\n')
-                
+            t0 = perf_counter()
+            if columns is None:
+                columns = [line[0] for line in self.recordset]
+
+            if compress or filename.endswith('.gz'):
+                f = gzip.open(filename, 'wt')
+            else:
+                f = open(filename, 'w')
+            f.write(delimiter.join(['time'] + columns) + '\n')
+
+            # Format a whole block of rows with a single string formatting operation
+            data = self.to_array(columns)
+            row_format = delimiter.join(['%d'] + [self.channel_format(x) for x in columns]) + '\n'
+            for i in range(0, data.shape[0], chunk_size):
+                block = data[i:i + chunk_size]
+                f.write((row_format * block.shape[0]) % tuple(block.ravel().tolist()))
+
             f.close()
+            self.timed_output(t0)
         else:
             print('No output file selected...')
 
+    def channel(self, name):
+        """
+        Returns the complete trajectory of a recorded variable as an array ('time' for the time steps)
+        """
+        if name == 'time':
+            return np.asarray(self.t_axis)
+
+        return np.asarray(self.results[name])
+
+    def channel_format(self, name):
+        """
+        Returns the text format of a channel ('%d' for integer channels, e.g. NET:iterations, '%s' otherwise)
+        """
+        if np.asarray(self.results[name]).dtype.kind in 'iub':
+            return '%d'
+
+        return '%s'
+
+    def to_array(self, columns=None):
+        """
+        Returns recorded variables as a 2D array (time steps x channels), with the time step as the first column
+        """
+        if columns is None:
+            columns = [line[0] for line in self.recordset]
+
+        data = np.empty((len(self.t_axis), len(columns) + 1))
+        data[:, 0] = self.t_axis
+        for i in range(len(columns)):
+            data[:, i + 1] = self.results[columns[i]]
+
+        return data
+
+    def write_compact(self, filename, encoding='delta', tol=1e-5, columns=None):
+        """
+        Write recorded variables to a compact .npz file (see pydyn.encoding for the available encodings)
+        This is the only writer of delta encoded trajectories (the dataset store is float64 / float32 only)
+        Returns the maximum absolute encoding error of each channel (time step first)
+        """
+        t0 = perf_counter()
+        if columns is None:
+            columns = [line[0] for line in self.recordset]
+
+        enc = codec.encode(self.to_array(columns), encoding, tol)
+        codec.write_encoded(filename, enc, ['time'] + columns)
+        self.timed_output(t0)
+
+        return enc['max_err']
+
+    def write_to_store(self, store):
+        """
+        Append recorded variables and fault description to a dataset store (pydyn.dataset)
+        """
+        t0 = perf_counter()
+        store.append(self)
+        self.timed_output(t0)
+
+    def timed_output(self, t0):
+        # Add the time of an output method to the run profile
+        if self.profile is not None:
+            self.profile.add('output', t0)
+
     def write_to_excel(self, path):
+        import pandas as pd
+
+        t0 = perf_counter()
         gen = {}
         bus = {}
         bran = {}
         load = {}
+        net = {}
         log = {'故障线路编号': [self.ppc['fault_log'][0]], '线路首端母线': [self.ppc['fault_log'][1]],
                '线路末段母线': [self.ppc['fault_log'][2]], '故障位置': [str(self.ppc['fault_log'][3]*100)+'%'],
                '故障起始时间': [self.ppc['fault_log'][4]], '故障清除时间': [self.ppc['fault_log'][5]],
                '故障类型': [self.ppc['fault_log'][6]], '是否稳定': [self.stability]}
         for i in self.results.keys():
             if i[:3] == 'GEN':
-                gen[i] = self.results[i]
+                gen[i] = self.channel(i)
             elif i[: 3] == 'BUS':
-                bus[i] = self.results[i]
+                bus[i] = self.channel(i)
             elif i[: 4] == 'BRAN':
-                bran[i] = self.results[i]
+                bran[i] = self.channel(i)
             elif i[: 4] == 'LOAD':
-                load[i] = self.results[i]
+                load[i] = self.channel(i)
+            elif i[: 3] == 'NET':
+                net[i] = self.channel(i)
         gen_df = pd.DataFrame(gen)
         bus_df = pd.DataFrame(bus)
         bran_df = pd.DataFrame(bran)
@@ -163,11 +267,16 @@ class recorder:
             bran_df.to_excel(writer, sheet_name='支路', float_format='%.5f')
             load_df.to_excel(writer, sheet_name='负荷', float_format='%.5f')
             log_df.to_excel(writer, sheet_name='故障描述', float_format='%.5f')
+            if net:
+                pd.DataFrame(net).to_excel(writer, sheet_name='网络求解', float_format='%.5g')
+        self.timed_output(t0)
 
     # TODO
     def plot_voltage_trajectory(self):
-        for i in range(39):
-            plt.scatter((self.results['BUS:U'+str(i)]*np.exp(1j*self.results['BUS:A'+str(i)])).real, (self.results['BUS:U'+str(i)]*np.exp(1j*self.results['BUS:A'+str(i)])).imag,
+        import matplotlib.pyplot as plt
+
+        for i in range(self.ppc['number_bus']):
+            plt.scatter((self.channel('BUS:U'+str(i))*np.exp(1j*self.channel('BUS:A'+str(i)))).real, (self.channel('BUS:U'+str(i))*np.exp(1j*self.channel('BUS:A'+str(i)))).imag,
                      )
         plt.legend()
         plt.xlabel('Real')
@@ -176,13 +285,127 @@ class recorder:
         plt.show()
 
     def plot_relative_angle(self):
+        import matplotlib.pyplot as plt
+
         # Plot variables
-        baseline = np.array(self.results["GEN:delta" + str(1)]) * 180 / np.pi
+        baseline = self.channel("GEN:delta" + str(1)) * 180 / np.pi
         for i in range(self.ppc['number_gen']-1):
-            plt.plot(self.t_axis, np.array(self.results["GEN:delta" + str(i + 2)]) * 180 / np.pi - baseline,
+            plt.plot(self.channel('time'), self.channel("GEN:delta" + str(i + 2)) * 180 / np.pi - baseline,
                      label="GEN" + str(i + 2))
         plt.legend()
         plt.xlabel('Time (s)')
         # plt.ylim((30,80))
         plt.ylabel('Rotor Angles (relative to GEN1)')
-        plt.show()
\ No newline at end of file
+        plt.show()
+
+    def plot_branch_flow(self, var='Qf'):
+        import matplotlib.pyplot as plt
+
+        # Plot a branch flow variable (Pf, Qf, Pt or Qt) of every branch
+        for i in range(self.ppc["number_branch"]):
+            plt.plot(self.channel('time'), self.channel("BRAN:" + var + str(i)))
+        plt.xlabel('Time (s)')
+        plt.ylabel(var)
+        plt.show()
+
+class stream_recorder(recorder):
+    """
+    Recorder that streams fixed-size chunks of recorded variables to a binary file during the simulation
+    Only the last 'window' time steps of each channel are kept in memory (in results and t_axis), the
+    complete trajectories are read from the stream file with to_array() and channel()
+    """
+    def __init__(self, filename, ppc, stream_file, chunk_size=1000, window=100):
+        recorder.__init__(self, filename, ppc)
+        self.stream_file = stream_file
+        self.chunk_size = chunk_size
+        self.n_cols = len(self.recordset) + 1
+        self.t_axis = deque(maxlen=window)
+        for line in self.recordset:
+            self.results[line[0]] = deque(maxlen=window)
+
+        self.chunk = np.empty((chunk_size, self.n_cols))
+        self.n_chunk = 0
+        self.n_rows = 0
+        self.pending = False
+
+        # Chunks are written by a background thread (bounded queue keeps at most two chunks in flight)
+        self.queue = queue.Queue(maxsize=2)
+        self.file = open(stream_file, 'wb')
+        self.writer = threading.Thread(target=self.write_chunks, daemon=True)
+        self.writer.start()
+
+    def write_chunks(self):
+        while True:
+            chunk = self.queue.get()
+            if chunk is None:
+                break
+            self.file.write(chunk.tobytes())
+        self.file.close()
+
+    def time_step(self, t):
+        """
+        Records time step (and commits the variables recorded in the previous time step)
+        """
+        self.commit()
+        self.t_axis.append(t)
+        self.pending = True
+
+    def commit(self):
+        if not self.pending:
+            return
+
+        row = self.chunk[self.n_chunk]
+        row[0] = self.t_axis[-1]
+        i = 1
+        for line in self.recordset:
+            row[i] = self.results[line[0]][-1]
+            i = i + 1
+
+        self.pending = False
+        self.n_chunk = self.n_chunk + 1
+        self.n_rows = self.n_rows + 1
+        if self.n_chunk == self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Hand the current chunk over to the writer thread
+        """
+        if self.n_chunk > 0:
+            self.queue.put(self.chunk[:self.n_chunk])
+            self.chunk = np.empty((self.chunk_size, self.n_cols))
+            self.n_chunk = 0
+
+    def close(self):
+        """
+        Commit the last time step, flush the remaining rows and wait for the writer thread to finish
+        """
+        if self.writer.is_alive():
+            self.commit()
+            self.flush()
+            self.queue.put(None)
+            self.writer.join()
+
+    def channel(self, name):
+        """
+        Returns the complete trajectory of a streamed variable (read from the stream file, not the in-memory window)
+        """
+        if name == 'time':
+            return np.array(self.to_array([])[:, 0])
+
+        return np.array(self.to_array([name])[:, 1])
+
+    def to_array(self, columns=None):
+        """
+        Returns the streamed variables as a 2D array (time steps x channels), memory-mapped from the stream file
+        """
+        self.close()
+        if self.n_rows == 0:
+            return np.empty((0, self.n_cols))
+
+        data = np.memmap(self.stream_file, dtype=np.float64, mode='r', shape=(self.n_rows, self.n_cols))
+        if columns is None:
+            return data
+
+        names = [line[0] for line in self.recordset]
+        return data[:, [0] + [names.index(x) + 1 for x in columns]]
@@ -0,0 +1,136 @@
+#!python3
+#
+# Copyright (C) 2014-2015 Julius Susanto. All rights reserved.
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file.
+
+"""
+PYPOWER-Dynamics
+Element Registry
+Dynamic model classes register how they connect to the network, and the simulation builds
+a source-to-bus incidence and dispatch table of its elements once per topology epoch
+
+"""
+
+import numpy as np
+
+# Registered model classes: class -> {'kind': ..., 'admittance': ...}
+MODELS = {}
+
+
+def register_model(cls, kind, admittance=None):
+    """
+    Register a dynamic model class
+
+    Inputs:
+        cls         Model class
+        kind        'gen'           current source at the bus of generator row gen_no
+                    'bus'           current source at bus row(s) bus_no (a scalar or an array of rows)
+                    'controller'    controller model (no connection to the network)
+        admittance  Function of an element returning its equivalent Norton admittance for the
+                    modified Ybus matrix (None if the model does not modify Ybus)
+    """
+    MODELS[cls] = {'kind': kind, 'admittance': admittance}
+
+
+def model_info(element):
+    """
+    Returns the registration of the class of an element, or of its nearest registered base class
+    (None for unregistered classes)
+    """
+    for cls in type(element).__mro__:
+        if cls in MODELS:
+            return MODELS[cls]
+
+    return None
+
+
+def model_kind(element):
+    """
+    Returns the registered kind of an element (or None for unregistered classes)
+    """
+    info = model_info(element)
+    if info is None:
+        return None
+
+    return info['kind']
+
+
+class element_table:
+    def __init__(self, elements, ppc_int):
+        """
+        Build the element table of a dictionary of dynamic model objects for the current internal case
+        """
+        self.sources = []
+        self.controllers = []
+        self.groups = {}
+
+        # Source-to-bus incidence
+        self.source_bus = []
+
+        # Dispatch lists for single-bus sources (bound calc_currents methods and bus indices)
+        # and for multi-bus sources (e.g. motor banks)
+        self.calcs = []
+        self.buses = []
+        self.multi = []
+
+        # Equivalent Norton admittances added to Ybus
+        self.y_buses = []
+        self.y_values = []
+
+        for element in elements.values():
+            kind = model_kind(element)
+            if kind == 'controller':
+                self.controllers.append(element)
+                continue
+            elif kind == 'gen':
+                bus = int(ppc_int['gen'][element.gen_no, 0])
+            elif kind == 'bus':
+                bus = ppc_int['bus'][element.bus_no, 0].astype(int)
+                if bus.ndim == 0:
+                    bus = int(bus)
+            else:
+                raise ValueError('Element "' + str(getattr(element, 'id', element)) + '" of class ' + type(element).__name__
+                                 + ' is not a registered dynamic model (see pydyn.registry.register_model)')
+
+            self.sources.append(element)
+            self.source_bus.append(bus)
+            self.groups.setdefault(type(element).__name__, []).append((element, bus))
+
+            admittance = model_info(element)['admittance']
+            if admittance is not None:
+                self.y_buses.append(bus)
+                self.y_values.append(admittance(element))
+
+        # Single-bus sources are dispatched grouped by model type
+        for group in self.groups.values():
+            for element, bus in group:
+                if isinstance(bus, int):
+                    self.calcs.append(element.calc_currents)
+                    self.buses.append(bus)
+                else:
+                    self.multi.append((element.calc_currents, bus))
+
+        self.buses = np.array(self.buses, dtype=int)
+
+    def currents(self, v, no_buses):
+        """
+        Returns the vector of source current injections for bus voltages v
+        """
+        I = np.zeros(no_buses, dtype='complex')
+        vb = v[self.buses].tolist()
+        np.add.at(I, self.buses, [calc(vi) for calc, vi in zip(self.calcs, vb)])
+
+        for calc, bus in self.multi:
+            np.add.at(I, bus, calc(v[bus]))
+
+        return I
+
+    def admittances(self, no_buses):
+        """
+        Returns the vector of equivalent source admittances added to the Ybus diagonal
+        """
+        Ye = np.zeros(no_buses, dtype='complex')
+        np.add.at(Ye, np.array(self.y_buses, dtype=int), self.y_values)
+
+        return Ye
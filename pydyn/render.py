@@ -0,0 +1,146 @@
+#!python3
+#
+# Copyright (C) 2014-2015 Julius Susanto. All rights reserved.
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file.
+
+"""
+PYPOWER-Dynamics
+Plot Renderer Class
+Renders plots of finished simulations (recorder objects or dataset store samples) to image files
+in a background thread or process pool with the non-interactive Agg backend, so that plotting
+does not add latency to sample generation
+
+Plot kinds:
+    relative_angle  Rotor angles relative to the first generator (GEN:delta channels)
+    branch_flow     Branch flow variable of every branch (BRAN:Qf channels by default, var='Pf', ...)
+
+The image format follows the file extension (e.g. .png or .svg).
+"""
+
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import numpy as np
+
+PLOT_KINDS = ['relative_angle', 'branch_flow']
+
+
+class plot_renderer:
+    def __init__(self, workers=1, processes=False):
+        """
+        Start a renderer with a pool of worker threads (or processes if processes is True)
+        """
+        if processes:
+            self.pool = ProcessPoolExecutor(max_workers=workers)
+        else:
+            self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.jobs = []
+
+    def submit_recorder(self, oRecord, filename, kind='relative_angle', **options):
+        """
+        Queue a plot of the variables of a finished recorder object
+        The recorded variables are copied, so the recorder can be reused or discarded immediately
+        """
+        channels = ['time'] + [line[0] for line in oRecord.recordset]
+        data = np.array(oRecord.to_array())
+        self.jobs.append(self.pool.submit(render_arrays, channels, data, kind, filename, options))
+
+    def submit_store(self, path, i, filename, kind='relative_angle', **options):
+        """
+        Queue a plot of sample i of the dataset store in directory path (read by the worker)
+        """
+        self.jobs.append(self.pool.submit(render_store_sample, path, i, kind, filename, options))
+
+    def render_store(self, path, filename_pattern, indices=None, kind='relative_angle', **options):
+        """
+        Queue plots of several samples of a dataset store (all samples by default)
+        filename_pattern is formatted with the sample number, e.g. 'plots/sample_{}.png'
+        """
+        if indices is None:
+            from pydyn.dataset import dataset_reader
+            indices = range(len(dataset_reader(path)))
+
+        for i in indices:
+            self.submit_store(path, i, filename_pattern.format(i), kind, **options)
+
+    def wait(self):
+        """
+        Wait for all queued plots and return the list of files written
+        Rendering errors are raised here
+        """
+        files = [job.result() for job in self.jobs]
+        self.jobs = []
+
+        return files
+
+    def close(self):
+        """
+        Wait for all queued plots and shut down the worker pool
+        """
+        files = self.wait()
+        self.pool.shutdown()
+
+        return files
+
+
+def render_store_sample(path, i, kind, filename, options):
+    """
+    Render a plot of sample i of a dataset store
+    """
+    from pydyn.dataset import dataset_reader
+
+    reader = dataset_reader(path)
+    data, entry = reader.sample(i)
+    options = dict(options)
+    if 'title' not in options and entry['branch'] >= 0:
+        options['title'] = ('Branch ' + str(int(entry['branch'])) + ' fault, cleared at ' + str(float(entry['clear_time'])) +
+                            ' s (' + ('stable' if entry['stable'] else 'unstable') + ')')
+
+    return render_arrays(reader.channels, np.array(data), kind, filename, options)
+
+
+def render_arrays(channels, data, kind, filename, options):
+    """
+    Render a plot of recorded variables (time steps x channels, channel names in channels) to an image file
+    Figures are drawn on an Agg canvas without pyplot (no windows, safe in worker threads)
+    """
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    fig = Figure(figsize=options.get('figsize', (8, 5)))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot(111)
+    t_axis = data[:, channels.index('time')]
+
+    if kind == 'relative_angle':
+        deltas = numbered_channels(channels, 'GEN:delta')
+        baseline = data[:, deltas[0][1]] * 180 / np.pi
+        for n, col in deltas[1:]:
+            ax.plot(t_axis, data[:, col] * 180 / np.pi - baseline, label='GEN' + str(n))
+        ax.legend()
+        ax.set_ylabel('Rotor Angles (relative to GEN' + str(deltas[0][0]) + ')')
+
+    elif kind == 'branch_flow':
+        var = options.get('var', 'Qf')
+        for n, col in numbered_channels(channels, 'BRAN:' + var):
+            ax.plot(t_axis, data[:, col])
+        ax.set_ylabel(var)
+
+    else:
+        raise ValueError('Unknown plot kind "' + str(kind) + '" (use one of ' + ', '.join(PLOT_KINDS) + ')')
+
+    ax.set_xlabel('Time (s)')
+    if 'title' in options:
+        ax.set_title(options['title'])
+
+    fig.savefig(filename, dpi=options.get('dpi', 100))
+
+    return filename
+
+
+def numbered_channels(channels, prefix):
+    # (number, column) pairs of the channels named prefix + number, in order of number
+    cols = [(int(x[len(prefix):]), i) for i, x in enumerate(channels) if x.startswith(prefix) and x[len(prefix):].isdigit()]
+    if not cols:
+        raise ValueError('No "' + prefix + '" channels to plot')
+
+    return sorted(cols)
@@ -0,0 +1,388 @@
+#!python3
+#
+# Copyright (C) 2014-2015 Julius Susanto. All rights reserved.
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file.
+
+"""
+PYPOWER-Dynamics
+Simulation Class
+Compiled simulation session of a case and a set of dynamic models. The load flow, Ybus build and
+factorisation, model initialisation and interface setup are done once, and the session can then be
+run repeatedly with different event sets (the initial state is restored at the start of each run)
+
+The bus and branch rows of the internal case are fixed for the whole session: the fault buses and
+split branches of branch faults are reserved when the session is compiled (program option
+fault_slots, the number of branch faults of a run, default 1), and events switch them in and out by
+value. The Ybus matrix is rebuilt and refactorised after events without renumbering the case, and
+the bus voltage vector and recorder channels keep their layout.
+"""
+
+from pydyn.interface import init_interfaces
+from pydyn.controller_bank import make_banks
+from pydyn.mod_Ybus import mod_Ybus
+from pydyn.registry import element_table, model_kind
+from pydyn.profiler import profiler
+from pydyn.watchdog import watchdog
+from pydyn.events import reserve_fault_slots
+from time import perf_counter
+from numpy import flatnonzero as find
+from scipy.sparse.linalg import splu
+import numpy as np
+import copy
+from pypower.runpf import runpf
+from pypower.ppoption import ppoption
+from pypower.ext2int import ext2int
+from pypower.makeYbus import makeYbus
+from pypower.idx_bus import VM, VA, PD, QD
+from pypower.idx_gen import PG, QG, VG
+from pypower.idx_brch import F_BUS, T_BUS, BR_STATUS, PF, PT, QF, QT
+from numpy import conj, zeros, c_, ix_
+
+
+class simulation:
+    def __init__(self, ppc, elements, dynopt = None, pf_results = None):
+        """
+        Compile a simulation session
+
+        Inputs:
+            ppc         PYPOWER load flow case
+            elements    Dictionary of dynamic model objects (machines, controllers, etc) with Object ID as key
+            dynopt      Program options
+            pf_results  Solved load flow of the case (e.g. a case solved by pydyn.batch_pf), the load
+                        flow is run if None. Its bus voltages and loads and its generator outputs
+                        replace those of ppc
+        """
+        self.elements = elements
+
+        # Program options
+        if dynopt:
+            self.h = dynopt['h']
+            self.t_sim = dynopt['t_sim']
+            self.max_err = dynopt['max_err']
+            self.max_iter = dynopt['max_iter']
+            self.verbose = dynopt['verbose']
+
+            # Check for controller bank option
+            if 'bank_controllers' in dynopt:
+                bank_controllers = dynopt['bank_controllers']
+            else:
+                bank_controllers = True
+
+            # Check for number of reserved branch fault slots
+            if 'fault_slots' in dynopt:
+                fault_slots = dynopt['fault_slots']
+            else:
+                fault_slots = 1
+        else:
+            # Default program options
+            self.h = 0.01               # step length (s)
+            self.t_sim = 5              # simulation time (s)
+            self.max_err = 0.0001       # Maximum error in network iteration (voltage mismatches)
+            self.max_iter = 25          # Maximum number of network iterations
+            self.verbose = False
+            bank_controllers = True     # Step controllers with the same structure in one vectorised call
+            fault_slots = 1             # Branch faults per run (reserved fault buses and split branches)
+
+        # Divergence and wall-clock checks of the runs
+        self.watchdog = watchdog(dynopt)
+
+        # Timing of the session setup (added to the profile of the first run)
+        self.setup_profile = profiler()
+        t0 = perf_counter()
+
+        # Set up interfaces
+        interfaces = init_interfaces(elements)
+
+        ##################
+        # INITIALISATION #
+        ##################
+
+        # Run power flow and update bus voltages and angles in PYPOWER case object
+        # (the power flow report is only printed with the verbose option)
+        if pf_results is not None:
+            results = pf_results
+            # The session is built on the loads and generator outputs of the solved load flow
+            if results["bus"].shape[0] != ppc["bus"].shape[0] or results["gen"].shape[0] != ppc["gen"].shape[0]:
+                raise ValueError('pf_results does not match the buses and generators of the case')
+            for col in [PD, QD]:
+                ppc["bus"][:, col] = results["bus"][:, col]
+            for col in [PG, QG, VG]:
+                ppc["gen"][:, col] = results["gen"][:, col]
+        elif self.verbose:
+            results, success = runpf(ppc)
+        else:
+            results, success = runpf(ppc, ppoption(VERBOSE=0, OUT_ALL=0))
+        ppc["bus"][:, VM] = results["bus"][:, VM]
+        ppc["bus"][:, VA] = results["bus"][:, VA]
+        self.ppc = ppc
+        t0 = self.setup_profile.add('power_flow', t0)
+
+        # Build Ybus matrix (of the internal case with the reserved fault slots)
+        self.ppc_int = ext2int(ppc)
+        self.n_bus = self.ppc_int["bus"].shape[0]
+        reserve_fault_slots(self.ppc_int, fault_slots)
+        baseMVA, bus, branch = self.ppc_int["baseMVA"], self.ppc_int["bus"], self.ppc_int["branch"]
+        self.Ybus, self.Yf, self.Yt = makeYbus(baseMVA, bus, branch)
+
+        # Build the source-to-bus incidence and dispatch table of the elements (rebuilt when the topology changes)
+        self.table = element_table(elements, self.ppc_int)
+
+        # Build modified Ybus matrix and factorise it
+        self.Ybus = mod_Ybus(self.Ybus, elements, bus, self.ppc_int['gen'], baseMVA, self.table)
+        t0 = self.setup_profile.add('ybus', t0)
+        self.Ybus_inv = splu(self.Ybus)
+        t0 = self.setup_profile.add('factorise', t0)
+
+        # Calculate initial voltage phasors
+        self.v0 = bus[:, VM] * (np.cos(np.radians(bus[:, VA])) + 1j * np.sin(np.radians(bus[:, VA])))
+        self.v0[self.n_bus:] = 0
+
+        # Initialise sources from load flow
+        for source, source_bus in zip(self.table.sources, self.table.source_bus):
+            if model_kind(source) == 'gen':
+                # Generator, external grid or VSC
+                S_source = np.complex(results["gen"][source.gen_no, 1] / baseMVA, results["gen"][source.gen_no, 2] / baseMVA)
+                source.initialise(self.v0[source_bus],S_source)
+            else:
+                # Asynchronous machine (or bank of machines)
+                source.initialise(self.v0[source_bus],0)
+
+        # Interface controllers and machines (for initialisation)
+        for intf in interfaces:
+            int_type = intf[0]
+            var_name = intf[1]
+            if int_type == 'OUTPUT':
+                # If an output, interface in the reverse direction for initialisation
+                intf[2].signals[var_name] = intf[3].signals[var_name]
+            else:
+                # Inputs are interfaced in normal direction during initialisation
+                intf[3].signals[var_name] = intf[2].signals[var_name]
+
+        # Initialise controllers
+        for controller in self.table.controllers:
+            controller.initialise()
+
+        # Group controllers with the same equation structure into banks
+        if bank_controllers:
+            banks, singles = make_banks(self.table.controllers)
+        else:
+            banks, singles = [], self.table.controllers
+
+        # Elements with a solve step (banked controllers are solved by their bank)
+        banked = [ctrl for bank in banks for ctrl in bank.ctrls]
+        self.steppers = [element for element in elements.values() if element not in banked] + banks
+
+        # Interfaces between controllers and machines (copied at every time step)
+        self.interfaces = interfaces
+
+        # Initial state of the elements (restored at the start of each run)
+        self.initial = dict((ID, element.snapshot()) for ID, element in elements.items())
+        self.setup_profile.add('initialise', t0)
+        self.runs = 0
+
+    def reset(self):
+        """
+        Restore the initial signals and states of all elements
+        """
+        for ID, element in self.elements.items():
+            element.restore(self.initial[ID])
+
+    def run(self, events = None, recorder = None, t_sim = None):
+        """
+        Run a time-domain simulation from the initial state
+
+        Inputs:
+            events      Events object
+            recorder    Recorder object (empty)
+            t_sim       Simulation time (s), defaults to the t_sim program option
+
+        Outputs:
+            recorder    Recorder object (with data, and the timing profile of the run in recorder.profile)
+
+        If the watchdog aborts the run, the failure reason is in recorder.failure (and self.failure),
+        otherwise these are None
+        """
+        prof = profiler()
+        self.profile = prof
+        if self.runs == 0:
+            prof.merge(self.setup_profile)
+        self.runs = self.runs + 1
+        prof.count('runs')
+
+        if t_sim is None:
+            t_sim = self.t_sim
+        h = self.h
+        gens = self.elements
+
+        self.reset()
+        self.watchdog.start(gens)
+        self.failure = None
+
+        # Events modify a working copy of the internal case (the recorder refers to it for the fault log)
+        ppc = copy.deepcopy(self.ppc_int)
+        if recorder is not None:
+            recorder.ppc = ppc
+            recorder.profile = prof
+
+        baseMVA, bus, branch = ppc["baseMVA"], ppc["bus"], ppc["branch"]
+        Yf, Yt = self.Yf, self.Yt
+        Ybus_inv = self.Ybus_inv
+        table = self.table
+
+        #############
+        # MAIN LOOP #
+        #############
+        if events == None:
+            print('Warning: no events!')
+
+        flag=None
+        v_prev = self.v0
+
+        # Numerical health of the network solution (since the last recorded time step)
+        health = {'iterations': 0, 'verr': 0.0, 'nonconv': 0, 'epoch': 0, 'h': h}
+        print('Simulating...')
+        for t in range(int(t_sim / h) + 1):
+            if np.mod(t,1/h) == 0:
+                print('t=' + str(t*h) + 's')
+
+            t0 = perf_counter()
+            prof.count('steps')
+
+            # Interface controllers and machines
+            for intf in self.interfaces:
+                var_name = intf[1]
+                intf[3].signals[var_name] = intf[2].signals[var_name]
+            t0 = prof.add('interfaces', t0)
+
+            # Solve differential equations
+            for j in range(4):
+                # Solve step of differential equations
+                for element in self.steppers:
+                    element.solve_step(h,j)
+                t0 = prof.add('solve_step', t0)
+
+                v_prev, n_iter, verr = solve_network(table, v_prev, Ybus_inv, len(bus), self.max_err, self.max_iter, self.n_bus)
+                prof.count('network_iterations', n_iter)
+                update_health(health, n_iter, verr, self.max_err)
+                t0 = prof.add('solve_network', t0)
+            bus_V = np.zeros((len(bus), 2))
+            for v in range(self.n_bus):
+                Va = np.arctan(v_prev[v].imag / v_prev[v].real)
+                Vm = v_prev[v].real / np.cos(Va)
+                bus_V[v][0] = Vm
+                bus_V[v][1] = Va
+
+            br = find(branch[:, BR_STATUS]).astype(int)  ## in-service branches
+            V = v_prev
+
+            # Out-of-service branches (tripped branches and unused split branches) carry no flow
+            branch[ix_(find(branch[:, BR_STATUS] == 0), [PF, QF, PT, QT])] = 0
+
+            # complex power at "from" bus
+            Sf = V[branch[br, F_BUS].astype(int)] \
+                 * conj(Yf[br, :] * V) * baseMVA
+            # complex power injected at "to" bus
+            St = V[branch[br, T_BUS].astype(int)] \
+                 * conj(Yt[br, :] * V) * baseMVA
+            branch[ix_(br, [PF, QF, PT, QT])] = c_[Sf.real, Sf.imag, St.real, St.imag]
+
+            # 故障线路的两部分合二为一
+            for f in ppc["fault"]:
+                branch[f[0], QT] = branch[f[1], QT]
+                branch[f[0], QF] = branch[f[1], QF]
+            t0 = prof.add('branch_flows', t0)
+
+            if recorder is not None:
+                # Record signals or states
+                recorder.time_step(t)
+                recorder.record_bus(bus_V)
+                recorder.record_gen(gens)
+                recorder.record_bran(branch)
+                recorder.record_load(ppc["load"])
+                recorder.record_net(health)
+                t0 = prof.add('recorder', t0)
+
+            # Abort diverging runs (the variables of the failed time step are recorded)
+            failure = self.watchdog.check(t, h, v_prev, health)
+            if failure is not None:
+                print('Simulation aborted at t=' + str(failure['time']) + 's: ' + failure['message'] +
+                      (' (' + failure['element'] + ')' if failure['element'] is not None else ''))
+                self.failure = failure
+                if recorder is not None:
+                    recorder.failure = failure
+                break
+
+            health['iterations'] = 0
+            health['verr'] = 0.0
+            health['nonconv'] = 0
+
+            if events is not None:
+                # Check event stack
+                ppc, refactorise, flag = events.handle_events(np.round(t*h,5), gens, ppc, baseMVA,flag)
+                t0 = prof.add('events', t0)
+
+                if refactorise is True:
+                    prof.count('refactorisations')
+                    health['epoch'] = health['epoch'] + 1
+
+                    # Rebuild Ybus and modified Ybus (the rows of the case are fixed, so the element table is kept)
+                    bus, branch = ppc["bus"], ppc["branch"]
+                    Ybus, Yf, Yt = makeYbus(baseMVA, bus, branch)
+                    Ybus = mod_Ybus(Ybus, gens, bus, ppc['gen'], baseMVA, table)
+                    t0 = prof.add('ybus', t0)
+
+                    # Refactorise Ybus
+                    Ybus_inv = splu(Ybus)
+                    t0 = prof.add('factorise', t0)
+
+                    # Solve network equations
+                    v_prev, n_iter, verr = solve_network(table, v_prev, Ybus_inv, len(bus), self.max_err, self.max_iter, self.n_bus)
+                    prof.count('network_iterations', n_iter)
+                    update_health(health, n_iter, verr, self.max_err)
+                    prof.add('solve_network', t0)
+
+        if recorder is not None:
+            t0 = perf_counter()
+            recorder.close()
+            prof.add('recorder', t0)
+
+        return recorder
+
+
+def update_health(health, n_iter, verr, max_err):
+    # Add a network solution to the health variables of the time step
+    health['iterations'] = health['iterations'] + n_iter
+    health['verr'] = max(health['verr'], float(verr))
+    if verr > max_err:
+        health['nonconv'] = health['nonconv'] + 1
+
+
+def solve_network(table, v_prev, Ybus_inv, no_buses, max_err, max_iter, no_check=None):
+    """
+    Solve network equations
+    The voltage mismatch is checked on the first no_check buses (the buses of the original case, i.e.
+    excluding the reserved fault buses), or on all buses if no_check is None
+    Returns the network voltages, the number of iterations and the final voltage mismatch
+    """
+    if no_check is None:
+        no_check = no_buses
+
+    verr = 1
+    i = 1
+    # Iterate until network voltages in successive iterations are within tolerance
+    while verr > max_err and i < max_iter:
+        # Update current injections for sources
+        I = table.currents(v_prev, no_buses)
+
+        # Solve for network voltages
+        vtmp = Ybus_inv.solve(I)
+        n = min(no_check, len(v_prev))
+        verr = np.abs(np.dot((vtmp[:n]-v_prev[:n]), np.transpose(vtmp[:n]-v_prev[:n])))
+        v_prev = vtmp
+        i = i + 1
+
+    if i >= max_iter:
+        print('Network voltages and current injections did not converge in time step...')
+
+    return v_prev, i - 1, verr
@@ -0,0 +1,161 @@
+#!python3
+#
+# Copyright (C) 2014-2015 Julius Susanto. All rights reserved.
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file.
+
+"""
+PYPOWER-Dynamics
+Small-Signal Screening Class
+Linearises the initialised machine-plus-network model of a compiled simulation session around its
+load flow point and checks the eigenvalues, so that operating points that are unstable (or poorly
+damped) before any fault can be rejected (or flagged) before time-domain simulation
+
+The state matrix A is built by central differences of the machine state derivatives (the
+derivatives() of the machine models, e.g. sym_order4), with the network solved on the factorised
+mod_Ybus-modified Ybus of the session for every perturbed state. Elements without derivatives()
+(controllers, external grids, ...) keep their initial signals and states, i.e. the machine inputs
+Vfd and Pm are held at their load flow values.
+
+The rotor angles of a system without an infinite bus have no absolute reference: the uniform angle
+shift is an eigenvalue at zero, which is excluded from the checks (eigenvalues with magnitude below
+zero_eig_tol).
+
+Checks (program options):
+    max_eig_real    Largest real part of an eigenvalue (1/s) of a stable operating point (default 1e-5)
+    min_damping     Smallest damping ratio of the oscillatory modes of a well damped operating point
+                    (default 0.01)
+    zero_eig_tol    Magnitude below which an eigenvalue is the angle reference mode (default 1e-4)
+"""
+
+from time import perf_counter
+import numpy as np
+from pydyn.simulation import solve_network
+
+
+class small_signal:
+    def __init__(self, dynopt=None, eps=1e-4, max_err=1e-24, max_iter=100):
+        """
+        Inputs:
+            dynopt      Program options (checks)
+            eps         State perturbation of the central differences
+            max_err     Voltage mismatch of the network solutions (tighter than in the time steps, so
+                        that the differences are not dominated by the network tolerance)
+            max_iter    Maximum number of network iterations
+        """
+        if dynopt is None:
+            dynopt = {}
+
+        if 'max_eig_real' in dynopt:
+            self.max_eig_real = dynopt['max_eig_real']
+        else:
+            self.max_eig_real = 1e-5
+
+        if 'min_damping' in dynopt:
+            self.min_damping = dynopt['min_damping']
+        else:
+            self.min_damping = 0.01
+
+        if 'zero_eig_tol' in dynopt:
+            self.zero_eig_tol = dynopt['zero_eig_tol']
+        else:
+            self.zero_eig_tol = 1e-4
+
+        self.eps = eps
+        self.max_err = max_err
+        self.max_iter = max_iter
+
+        self.A = None
+        self.names = []
+
+    def derivatives(self, sim, x):
+        """
+        Returns the derivatives of the machine states x (network solved for the states)
+        """
+        for (element, state), value in zip(self.index, x):
+            element.states[state] = value
+
+        solve_network(sim.table, sim.v0, sim.Ybus_inv, len(sim.v0), self.max_err, self.max_iter)
+
+        f = []
+        for element in self.machines:
+            df = element.derivatives()
+            f.extend(df[state] for state in sorted(element.states))
+
+        return np.array(f)
+
+    def linearise(self, sim):
+        """
+        Returns the state matrix of the machine states of a simulation session at its initial state
+        (the session is restored to its initial state afterwards)
+        """
+        sim.reset()
+        machines = [element for element in sim.elements.values() if hasattr(element, 'derivatives')]
+        self.machines = machines
+        self.index = [(element, state) for element in machines for state in sorted(element.states)]
+        self.names = [element.id + ':' + state for element, state in self.index]
+        self.fixed = [ID for ID, element in sim.elements.items() if element not in machines]
+
+        x0 = np.array([element.states[state] for element, state in self.index], dtype=float)
+        n = len(x0)
+
+        try:
+            # Residual derivatives at the initial state (zero if the initialisation is consistent)
+            self.f0 = self.derivatives(sim, x0)
+
+            A = np.zeros((n, n))
+            for i in range(n):
+                dx = np.zeros(n)
+                dx[i] = self.eps
+                A[:, i] = (self.derivatives(sim, x0 + dx) - self.derivatives(sim, x0 - dx)) / (2 * self.eps)
+        finally:
+            sim.reset()
+
+        self.A = A
+
+        return A
+
+    def screen(self, sim):
+        """
+        Linearise a simulation session and check its eigenvalues
+        Returns a result dictionary:
+            stable              No eigenvalue (other than the angle reference) with real part above max_eig_real
+            damped              No oscillatory mode with damping ratio below min_damping
+            max_real            Largest real part of the eigenvalues (1/s)
+            min_damping         Smallest damping ratio of the oscillatory modes
+            frequency           Frequency of the least damped mode (Hz)
+            eigenvalues         Eigenvalues (angle reference modes excluded)
+            reference_modes     Number of excluded eigenvalues
+            equilibrium_error   Largest state derivative at the initial state
+            fixed               IDs of the elements held at their initial state
+            time                Time of the screening (s)
+        """
+        t0 = perf_counter()
+        A = self.linearise(sim)
+        eigs = np.linalg.eigvals(A)
+
+        reference = np.abs(eigs) < self.zero_eig_tol
+        eigs = eigs[~reference]
+        eigs = eigs[np.argsort(-eigs.real)]
+
+        result = {'stable': True, 'damped': True, 'max_real': -np.inf, 'min_damping': np.inf, 'frequency': np.nan,
+                  'eigenvalues': eigs, 'reference_modes': int(np.sum(reference)),
+                  'equilibrium_error': float(np.max(np.abs(self.f0))) if len(self.f0) > 0 else 0.0,
+                  'fixed': self.fixed}
+
+        if len(eigs) > 0:
+            result['max_real'] = float(eigs[0].real)
+            result['stable'] = result['max_real'] <= self.max_eig_real
+
+            # Damping ratios of the oscillatory modes
+            modes = eigs[eigs.imag > 1e-6]
+            if len(modes) > 0:
+                zeta = -modes.real / np.abs(modes)
+                k = np.argmin(zeta)
+                result['min_damping'] = float(zeta[k])
+                result['frequency'] = float(modes[k].imag / (2 * np.pi))
+                result['damped'] = result['min_damping'] >= self.min_damping
+
+        result['time'] = perf_counter() - t0
+
+        return result
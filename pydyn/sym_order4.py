@@ -11,9 +11,11 @@ PYPOWER-Dynamics
 """
 
 import numpy as np
+from pydyn.registry import register_model
+from pydyn.element_state import element_state
 
-class sym_order4:
-    def __init__(self, filename, dynopt):
+class sym_order4(element_state):
+    def __init__(self, filename, dynopt, params=None):
         self.signals = {}
         self.states = {}
         self.states0 = {}
@@ -28,7 +30,10 @@ class sym_order4:
         else:
             self.speed_volt = False
         
-        self.parser(filename)
+        if params is None:
+            self.parser(filename)
+        else:
+            self.set_params(params)
         
         # Convert impedances and H to 100MVA base
         if 'MVA_Rating' in self.params.keys():
@@ -65,6 +70,17 @@ class sym_order4:
                 
         f.close()
     
+    def set_params(self, params):
+        """
+        Populate the dictionary of parameters from a dictionary of values (e.g. a row of a fleet file)
+        instead of a machine file
+        """
+        self.id = params['ID']
+        self.gen_no = int(params['GEN_NO'])
+        for x, value in params.items():
+            if x not in ['ID', 'GEN_NO']:
+                self.params[x] = float(value)
+    
     def initialise(self, vt0, S0):
         """
         Initialise machine signals and states based on load flow voltage and complex power injection
@@ -185,17 +201,11 @@ class sym_order4:
             print('Warning: differential equations not zero on initialisation...')
             print('dEdp = ' + str(dEdp) + ', dEqp = ' + str(dEqp))
     
-    def solve_step(self,h,dstep):
+    def derivatives(self):
         """
-        Solve machine differential equations for the next stage in the integration step
+        Returns the derivatives of the machine states for the current states and signals (the
+        signals Id, Iq and P of the last network solution)
         """
-        
-        # Initial state variables
-        omega_0 = self.states['omega']
-        delta_0 = self.states['delta']
-        Eqp_0 = self.states['Eqp']
-        Edp_0 = self.states['Edp']
-        
         Xd = self.params['Xd']
         Xdp = self.params['Xdp']
         Xq = self.params['Xq']
@@ -208,18 +218,31 @@ class sym_order4:
         Iq = self.signals['Iq']
         
         # Electrical differential equations
-        f1 = (Vfd - (Xd - Xdp) * Id - Eqp_0) / Td0p
-        k_Eqp = h * f1
-        
-        f2 = ((Xq - Xqp) * Iq - Edp_0) / Tq0p
-        k_Edp = h * f2
+        f1 = (Vfd - (Xd - Xdp) * Id - self.states['Eqp']) / Td0p
+        f2 = ((Xq - Xqp) * Iq - self.states['Edp']) / Tq0p
         
         # Swing equation
-        f3 = 1/(2 * self.params['H']) * (self.signals['Pm'] / omega_0 - self.signals['P'])
-        k_omega = h * f3
+        f3 = 1/(2 * self.params['H']) * (self.signals['Pm'] / self.states['omega'] - self.signals['P'])
+        f4 = self.omega_n * (self.states['omega'] - 1)
         
-        f4 = self.omega_n * (omega_0 - 1)
-        k_delta = h * f4
+        return {'Eqp': f1, 'Edp': f2, 'omega': f3, 'delta': f4}
+    
+    def solve_step(self,h,dstep):
+        """
+        Solve machine differential equations for the next stage in the integration step
+        """
+        
+        # Initial state variables
+        omega_0 = self.states['omega']
+        delta_0 = self.states['delta']
+        Eqp_0 = self.states['Eqp']
+        Edp_0 = self.states['Edp']
+        
+        f = self.derivatives()
+        k_Eqp = h * f['Eqp']
+        k_Edp = h * f['Edp']
+        k_omega = h * f['omega']
+        k_delta = h * f['delta']
 
         if self.opt == 'mod_euler':
             # Modified Euler
@@ -284,4 +307,6 @@ class sym_order4:
                 self.states['omega'] = self.states0['omega'] + 1/6 * (self.dsteps['omega'][0] + 2*self.dsteps['omega'][1] + 2*self.dsteps['omega'][2] + k_omega)
                 self.states['delta'] = self.states0['delta'] + 1/6 * (self.dsteps['delta'][0] + 2*self.dsteps['delta'][1] + 2*self.dsteps['delta'][2] + k_delta)
                 self.signals['Tm'] = self.signals['Pm'] / omega_0
-   
\ No newline at end of file
+
+
+register_model(sym_order4, 'gen', lambda element: element.Yg)
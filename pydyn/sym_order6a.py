@@ -12,9 +12,11 @@ Anderson, P. M., Fouad, A. A., "Power System Control and Stability", Wiley-IEEE
 """
 
 import numpy as np
+from pydyn.registry import register_model
+from pydyn.element_state import element_state
 
-class sym_order6a:
-    def __init__(self, filename, dynopt):
+class sym_order6a(element_state):
+    def __init__(self, filename, dynopt, params=None):
         self.id = ''
         self.gen_no = 0
         self.signals = {}
@@ -31,7 +33,10 @@ class sym_order6a:
         else:
             self.speed_volt = False
         
-        self.parser(filename)
+        if params is None:
+            self.parser(filename)
+        else:
+            self.set_params(params)
         
         # Convert impedances and H to 100MVA base
         if 'MVA_Rating' in self.params.keys():
@@ -67,6 +72,17 @@ class sym_order6a:
                 
         f.close()
     
+    def set_params(self, params):
+        """
+        Populate the dictionary of parameters from a dictionary of values (e.g. a row of a fleet file)
+        instead of a machine file
+        """
+        self.id = params['ID']
+        self.gen_no = int(params['GEN_NO'])
+        for x, value in params.items():
+            if x not in ['ID', 'GEN_NO']:
+                self.params[x] = float(value)
+    
     def initialise(self, vt0, S0):
         """
         Initialise machine signals and states based on load flow voltage and complex power injection
@@ -300,3 +316,6 @@ class sym_order6a:
                 self.states['omega'] = self.states0['omega'] + 1/6 * (self.dsteps['omega'][0] + 2*self.dsteps['omega'][1] + 2*self.dsteps['omega'][2] + k_omega)
                 self.states['delta'] = self.states0['delta'] + 1/6 * (self.dsteps['delta'][0] + 2*self.dsteps['delta'][1] + 2*self.dsteps['delta'][2] + k_delta)
                 self.signals['Tm'] = self.signals['Pm'] / omega_0
+
+
+register_model(sym_order6a, 'gen', lambda element: element.Yg)
@@ -12,9 +12,11 @@ Sauer, P.W., Pai, M. A., "Power System Dynamics and Stability", Stipes Publishin
 """
 
 import numpy as np
+from pydyn.registry import register_model
+from pydyn.element_state import element_state
 
-class sym_order6b:
-    def __init__(self, filename, dynopt):
+class sym_order6b(element_state):
+    def __init__(self, filename, dynopt, params=None):
         self.id = ''
         self.gen_no = 0
         self.signals = {}
@@ -31,7 +33,10 @@ class sym_order6b:
         else:
             self.speed_volt = False
         
-        self.parser(filename)
+        if params is None:
+            self.parser(filename)
+        else:
+            self.set_params(params)
         
         # Convert impedances and H to 100MVA base
         if 'MVA_Rating' in self.params.keys():
@@ -73,6 +78,17 @@ class sym_order6b:
                 
         f.close()
     
+    def set_params(self, params):
+        """
+        Populate the dictionary of parameters from a dictionary of values (e.g. a row of a fleet file)
+        instead of a machine file
+        """
+        self.id = params['ID']
+        self.gen_no = int(params['GEN_NO'])
+        for x, value in params.items():
+            if x not in ['ID', 'GEN_NO']:
+                self.params[x] = float(value)
+    
     def initialise(self, vt0, S0):
         """
         Initialise machine signals and states based on load flow voltage and complex power injection
@@ -372,3 +388,6 @@ class sym_order6b:
                 self.states['omega'] = self.states0['omega'] + 1/6 * (self.dsteps['omega'][0] + 2*self.dsteps['omega'][1] + 2*self.dsteps['omega'][2] + k_omega)
                 self.states['delta'] = self.states0['delta'] + 1/6 * (self.dsteps['delta'][0] + 2*self.dsteps['delta'][1] + 2*self.dsteps['delta'][2] + k_delta)
                 self.signals['Tm'] = self.signals['Pm'] / omega_0
+
+
+register_model(sym_order6b, 'gen', lambda element: element.Yg)
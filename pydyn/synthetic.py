@@ -0,0 +1,177 @@
+#!python3
+#
+# Copyright (C) 2014-2015 Julius Susanto. All rights reserved.
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file.
+
+"""
+PYPOWER-Dynamics
+Synthetic Case Generator
+Builds large test systems for scaling studies by tiling copies of a base case (case39 by default)
+and interconnecting neighbouring copies with tie lines, together with matching machine files
+
+Tile k holds the buses of the base case renumbered by k * (number of buses of the base case), and
+its generators follow those of tile k-1 (machine GEN<k * n_gen + i> has GEN_NO k * n_gen + i - 1).
+Only the slack bus of the first tile remains a reference bus, the slack buses of the other tiles
+become PV buses. The tiles are placed on a ring (a chain for two tiles): tile k is connected to
+tile k+1 by tie lines between the tie buses of the base case.
+"""
+
+import os
+import numpy as np
+from pypower.loadcase import loadcase
+from pypower.idx_bus import BUS_I, BUS_TYPE, REF, PV, PD, QD
+from pypower.idx_gen import GEN_BUS
+from pypower.idx_brch import F_BUS, T_BUS, BR_R, BR_X, BR_B, RATE_A, RATE_B, RATE_C, BR_STATUS, ANGMIN, ANGMAX
+from pydyn.fleet import read_machine_file, write_fleet
+
+# Tie lines between neighbouring tiles (bus of tile k, bus of tile k+1), numbered as in the base case
+TIE_BUSES = [(16, 16), (2, 2)]
+
+# Tie line parameters (r, x, b in pu, rating in MVA), those of the 345 kV line 1-2 of case39
+TIE_LINE = (0.0035, 0.0411, 0.6987, 600)
+
+
+def tile_case(ppc, n_tiles, ties=TIE_BUSES, tie_line=TIE_LINE):
+    """
+    Returns a case of n_tiles interconnected copies of the case ppc (with consecutive bus numbers 1..n)
+    """
+    n_bus = ppc["bus"].shape[0]
+    if not np.array_equal(ppc["bus"][:, BUS_I], np.arange(1, n_bus + 1)):
+        raise ValueError('The base case must have consecutive bus numbers starting at 1')
+
+    buses = []
+    gens = []
+    branches = []
+    for k in range(n_tiles):
+        bus = ppc["bus"].copy()
+        bus[:, BUS_I] = bus[:, BUS_I] + k * n_bus
+        if k > 0:
+            bus[bus[:, BUS_TYPE] == REF, BUS_TYPE] = PV
+        buses.append(bus)
+
+        gen = ppc["gen"].copy()
+        gen[:, GEN_BUS] = gen[:, GEN_BUS] + k * n_bus
+        gens.append(gen)
+
+        branch = ppc["branch"].copy()
+        branch[:, [F_BUS, T_BUS]] = branch[:, [F_BUS, T_BUS]] + k * n_bus
+        branches.append(branch)
+
+    # Tie lines to the next tile (the last tile closes the ring)
+    pairs = [(k, k + 1) for k in range(n_tiles - 1)]
+    if n_tiles > 2:
+        pairs.append((n_tiles - 1, 0))
+    for k, m in pairs:
+        for f, t in ties:
+            tie = np.zeros(ppc["branch"].shape[1])
+            tie[[F_BUS, T_BUS]] = [f + k * n_bus, t + m * n_bus]
+            tie[[BR_R, BR_X, BR_B]] = tie_line[:3]
+            tie[[RATE_A, RATE_B, RATE_C]] = tie_line[3]
+            tie[BR_STATUS] = 1
+            tie[ANGMIN] = -360
+            tie[ANGMAX] = 360
+            branches.append(tie[None, :])
+
+    tiled = {"version": '2', "baseMVA": ppc["baseMVA"]}
+    tiled["bus"] = np.vstack(buses)
+    tiled["gen"] = np.vstack(gens)
+    tiled["branch"] = np.vstack(branches)
+    bookkeeping(tiled)
+
+    return tiled
+
+
+def bookkeeping(ppc):
+    # Fault list, element counts and load list used by the events and the recorder (as in case39.py)
+    ppc["fault"] = []
+    ppc["number_branch"] = len(ppc["branch"])
+    ppc["number_bus"] = len(ppc["bus"])
+    ppc["number_gen"] = len(ppc["gen"])
+
+    ppc["load"] = []
+    for i in range(ppc["number_bus"]):
+        if ppc["bus"][i][PD] != 0:
+            ppc["load"].append([ppc["bus"][i][PD], ppc["bus"][i][QD]])
+    ppc["number_load"] = len(ppc["load"])
+
+
+def write_case(filename, ppc):
+    """
+    Write a case to a PYPOWER case file (the case function is named after the file)
+    """
+    name = os.path.splitext(os.path.basename(filename))[0]
+
+    f = open(filename, 'w')
+    f.write('"""\nSynthetic case with ' + str(len(ppc["bus"])) + ' buses (generated by pydyn.synthetic)\n"""\n\n')
+    f.write('from numpy import array\n\n\n')
+    f.write('def ' + name + '():\n')
+    f.write('    ppc = {"version": \'2\'}\n')
+    f.write('    ppc["baseMVA"] = ' + repr(float(ppc["baseMVA"])) + '\n\n')
+    for x in ['bus', 'gen', 'branch']:
+        f.write('    ppc["' + x + '"] = array([\n')
+        f.write(',\n'.join('        [' + ', '.join(repr(float(value)) for value in row) + ']' for row in ppc[x]))
+        f.write('\n    ])\n\n')
+    f.write('    ppc["fault"] = []\n')
+    f.write('    ppc["number_branch"] = len(ppc["branch"])\n')
+    f.write('    ppc["number_bus"] = len(ppc["bus"])\n')
+    f.write('    ppc["number_gen"] = len(ppc["gen"])\n\n')
+    f.write('    ppc["load"] = []\n')
+    f.write('    for i in range(ppc["number_bus"]):\n')
+    f.write('        if ppc["bus"][i][2] != 0:\n')
+    f.write('            ppc["load"].append([ppc["bus"][i][2], ppc["bus"][i][3]])\n')
+    f.write('    ppc["number_load"] = len(ppc["load"])\n\n')
+    f.write('    return ppc\n')
+    f.close()
+
+
+def tile_machines(machine_files, n_tiles, directory):
+    """
+    Write the machine files of n_tiles copies of the machines of the base case (machine_files in
+    order of the generator rows) to directory
+    Returns the list of machine files written (in order of the generator rows of the tiled case)
+    """
+    base = [read_machine_file(x) for x in machine_files]
+    n_gen = len(base)
+
+    filenames = []
+    for k in range(n_tiles):
+        for i, row in enumerate(base):
+            n = k * n_gen + i
+            filename = os.path.join(directory, 'G' + str(n + 1) + '.mach')
+            f = open(filename, 'w')
+            f.write('# Synthetic machine parameters (tile ' + str(k) + ', ' + row['ID'] + ' of the base case)\n\n')
+            for x, value in row.items():
+                if x == 'ID':
+                    value = 'GEN' + str(n + 1)
+                elif x == 'GEN_NO':
+                    value = str(n)
+                f.write(x + ' = ' + value + '\n')
+            f.close()
+            filenames.append(filename)
+
+    return filenames
+
+
+def make_case(directory, n_tiles, base_case='case39.py', machine_files=None, model='sym_order4'):
+    """
+    Write a tiled case file, its machine files and a fleet file of the machines to directory
+    The machine files of the base case default to generator/G1.mach ... (one per generator row)
+    Returns the case file, the list of machine files and the fleet file
+    """
+    ppc = loadcase(base_case)
+    if machine_files is None:
+        machine_files = [os.path.join('generator', 'G' + str(i + 1) + '.mach') for i in range(len(ppc["gen"]))]
+
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    name = os.path.splitext(os.path.basename(base_case))[0]
+    case_file = os.path.join(directory, name + 'x' + str(n_tiles) + '.py')
+    write_case(case_file, tile_case(ppc, n_tiles))
+
+    files = tile_machines(machine_files, n_tiles, directory)
+    fleet_file = os.path.join(directory, 'fleet.csv')
+    write_fleet(fleet_file, files, [model] * len(files))
+
+    return case_file, files, fleet_file
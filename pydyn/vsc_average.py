@@ -11,8 +11,10 @@ Average model of a VSC in voltage-control mode (i.e. controlled voltage source b
 """
 
 import numpy as np
+from pydyn.registry import register_model
+from pydyn.element_state import element_state
 
-class vsc_average:
+class vsc_average(element_state):
     def __init__(self, ID, gen_no, Rl, Xl, dynopt):
         self.id = ID
         self.gen_no = gen_no
@@ -99,6 +101,6 @@ class vsc_average:
         
         # State variables do not change in this model
         pass
-        
-    
-    
\ No newline at end of file
+
+
+register_model(vsc_average, 'gen', lambda element: element.Yg)
@@ -0,0 +1,97 @@
+#!python3
+#
+# Copyright (C) 2014-2015 Julius Susanto. All rights reserved.
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file.
+
+"""
+PYPOWER-Dynamics
+Watchdog Class
+Detects diverging or pathological simulation runs after each time step, so that the run can be
+aborted early with a structured failure reason instead of running to the end
+
+Checks (program options, None disables a check):
+    max_nonconv_steps   Consecutive time steps with a non-converged network solution (default 20)
+    max_omega_dev       Runaway machine speed, |omega - 1| in pu (default 0.5)
+    wall_budget         Wall-clock time budget of a run in seconds (default None)
+Non-finite (NaN / Inf) bus voltages or machine states are always a failure.
+
+Failure reasons:
+    nonconvergence, non_finite, omega, wall_clock
+"""
+
+from time import perf_counter
+import numpy as np
+
+
+class watchdog:
+    def __init__(self, dynopt=None):
+        if dynopt is None:
+            dynopt = {}
+
+        if 'max_nonconv_steps' in dynopt:
+            self.max_nonconv_steps = dynopt['max_nonconv_steps']
+        else:
+            self.max_nonconv_steps = 20
+
+        if 'max_omega_dev' in dynopt:
+            self.max_omega_dev = dynopt['max_omega_dev']
+        else:
+            self.max_omega_dev = 0.5
+
+        if 'wall_budget' in dynopt:
+            self.wall_budget = dynopt['wall_budget']
+        else:
+            self.wall_budget = None
+
+        self.machines = []
+        self.failure = None
+
+    def start(self, elements):
+        """
+        Start watching a run of the elements (the clock of the wall-clock budget starts here)
+        """
+        # Elements with machine states (dictionaries of states with a rotor speed)
+        self.machines = [element for element in elements.values()
+                         if isinstance(element.states, dict) and 'omega' in element.states]
+        self.nonconv_steps = 0
+        self.failure = None
+        self.t_start = perf_counter()
+
+    def check(self, t, h, v, health):
+        """
+        Check the run after time step t (bus voltages v, network health variables of the time step)
+        Returns None, or the failure dictionary if the run should be aborted
+        """
+        if not np.isfinite(v).all():
+            return self.fail('non_finite', t, h, None, 'non-finite bus voltages')
+
+        for machine in self.machines:
+            for x, value in machine.states.items():
+                if not np.isfinite(value):
+                    return self.fail('non_finite', t, h, machine.id, 'non-finite state ' + x)
+
+            if self.max_omega_dev is not None and abs(machine.states['omega'] - 1) > self.max_omega_dev:
+                return self.fail('omega', t, h, machine.id,
+                                 'speed deviation ' + str(round(machine.states['omega'] - 1, 4)) + ' pu')
+
+        if health['nonconv'] > 0:
+            self.nonconv_steps = self.nonconv_steps + 1
+            if self.max_nonconv_steps is not None and self.nonconv_steps >= self.max_nonconv_steps:
+                return self.fail('nonconvergence', t, h, None,
+                                 'network solution did not converge in ' + str(self.nonconv_steps) + ' consecutive time steps')
+        else:
+            self.nonconv_steps = 0
+
+        if self.wall_budget is not None:
+            elapsed = perf_counter() - self.t_start
+            if elapsed > self.wall_budget:
+                return self.fail('wall_clock', t, h, None,
+                                 'wall-clock budget of ' + str(self.wall_budget) + ' s exceeded (' + str(round(elapsed, 2)) + ' s)')
+
+        return None
+
+    def fail(self, reason, t, h, element, message):
+        self.failure = {'reason': reason, 'step': t, 'time': np.round(t * h, 5), 'element': element, 'message': message}
+
+        return self.failure
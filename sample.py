@@ -1,28 +1,54 @@
 import numpy as np
 from pydyn.sym_order4 import sym_order4
 from pydyn.ext_grid import ext_grid
+from pydyn.fleet import fleet
 
 # Simulation modules
 from pydyn.events import events
 from pydyn.recorder import recorder
-from pydyn.run_sim import run_sim
+from pydyn.simulation import simulation
+from pydyn.small_signal import small_signal
+from pydyn.dataset import dataset_store
+from pydyn.render import plot_renderer
+from pydyn.profiler import merge_profiles
 import copy
+import os
 # External modules
 from pypower.loadcase import loadcase
-import matplotlib.pyplot as plt
+
+
+# Timing profiles of all simulation runs
+profiles = []
+
+# Watchdog failure reasons of diverging (unstable) runs, other aborted runs are not labelled
+DIVERGENCE_REASONS = ['omega', 'non_finite']
 
 
 # generate critical sample
-def criticalSample(case, elements, dynopt, fault):
+def criticalSample(case, elements, dynopt, fault, store=None, renderer=None):
     min_time = 1                                  # min clear time
     max_time = dynopt['t_sim'] / dynopt['h'] / 8  # max clear time
-    ppc = copy.deepcopy(case)
+
+    # Compile the case and elements once (every run starts from the same initial state)
+    sim = simulation(copy.deepcopy(case), elements, dynopt)
+
+    # Pre-fault small-signal screening: an operating point that is unstable without a fault has no critical sample
+    screen = small_signal(dynopt).screen(sim)
+    if not screen['stable']:
+        print('Operating point is small-signal unstable (largest eigenvalue real part ' + str(round(screen['max_real'], 4)) + ' 1/s), no critical sample')
+        return None
+    if not screen['damped']:
+        print('Warning: poorly damped mode at ' + str(round(screen['frequency'], 3)) + ' Hz (damping ratio ' + str(round(screen['min_damping'], 4)) + ')')
 
     # whether the critical sample exists
     fault['clear_time'] = min_time * dynopt["h"]
     writeEventFile(fault)
-    recorder = simulation(ppc, elements, dynopt)
-    if TransientStability(recorder) is False:
+    recorder = runSample(sim, case, dynopt['t_sim'])
+    stability = TransientStability(recorder)
+    if stability is None:
+        print('Simulation aborted (' + recorder.failure['reason'] + '), no critical sample')
+        return None
+    if stability is False:
         print('Can not generate critical sample sample, please adjust the parameters')
         return None
 
@@ -32,29 +58,47 @@ def criticalSample(case, elements, dynopt, fault):
         fault['clear_time'] = round(curr_time * dynopt["h"], 2)
         writeEventFile(fault)
         dynopt['t_sim'] = round(5+curr_time*dynopt["h"], 2)
-        ppc = copy.deepcopy(case)
-        recorder = simulation(ppc, elements, dynopt)
+        recorder = runSample(sim, case, dynopt['t_sim'])
         stability = TransientStability(recorder)
         print('切除故障时间:', curr_time, '是否稳定:', stability)
+        if stability is None:
+            # Aborted runs have no label, the bisection cannot continue
+            print('Simulation aborted (' + recorder.failure['reason'] + '), no critical sample')
+            return None
         if stability:
             min_time = curr_time
         else:
             max_time = curr_time
         curr_time = round((min_time + max_time) / 2)
-    recorder.write_to_excel('critical sample\\' + fault['type'] + str(fault['object']) + '.xlsx')
+    if store is not None:
+        recorder.write_to_store(store)
+    else:
+        recorder.write_to_excel('critical sample\\' + fault['type'] + str(fault['object']) + '.xlsx')
+    if renderer is not None:
+        # Relative angle plot rendered in the background
+        renderer.submit_recorder(recorder, os.path.join('critical sample', fault['type'] + str(fault['object']) + '.png'))
 
 
 # generate transient sample
-def transientSample(case, elements, dynopt, fault):
-    ppc = case
+def transientSample(case, elements, dynopt, fault, store=None, renderer=None):
+    sim = simulation(case, elements, dynopt)
     writeEventFile(fault)
-    recorder = simulation(ppc, elements, dynopt)
+    recorder = runSample(sim, case, dynopt['t_sim'])
     stability = TransientStability(recorder)
     print('切除故障时间', fault['clear_time'] * dynopt['h'], '是否稳定', stability)
-    recorder.write_to_excel('transient sample\\'+fault['type'] +str(fault['object'])+'.xlsx')
+    if stability is None:
+        print('Simulation aborted (' + recorder.failure['reason'] + '), sample not written')
+        return None
+    if store is not None:
+        recorder.write_to_store(store)
+    else:
+        recorder.write_to_excel('transient sample\\'+fault['type'] +str(fault['object'])+'.xlsx')
+    if renderer is not None:
+        # Relative angle plot rendered in the background
+        renderer.submit_recorder(recorder, os.path.join('transient sample', fault['type'] + str(fault['object']) + '.png'))
 
 
-def simulation(case, elements, dynopt):
+def runSample(sim, case, t_sim):
     # Create event stack
     oEvents = events('events.evnt')
 
@@ -62,19 +106,28 @@ def simulation(case, elements, dynopt):
     oRecord = recorder('recorder.rcd', case)
 
     # Run simulation
-    oRecord = run_sim(case, elements, dynopt, oEvents, oRecord)
+    oRecord = sim.run(oEvents, oRecord, t_sim)
+    profiles.append(oRecord.profile)
 
     return oRecord
 
 
 # 暂态稳定判断
+# Returns None if the run was aborted for a reason that says nothing about the rotor angles
 def TransientStability(oRecord):
     result = True
-    oRecord.plot_relative_angle()
-    baseline = np.array(oRecord.results["GEN:delta" + str(1)]) * 180 / np.pi
+    if oRecord.failure is not None:
+        if oRecord.failure['reason'] in DIVERGENCE_REASONS:
+            # 仿真发散，按失稳处理
+            oRecord.stability = False
+            return False
+        # 仿真被中止（时间预算或网络不收敛），轨迹不完整，无标签
+        oRecord.stability = None
+        return None
+    baseline = oRecord.channel("GEN:delta" + str(1)) * 180 / np.pi
     for i in range(len(elements) - 1):
         # 相对功角大于180
-        if max(abs(np.array(oRecord.results["GEN:delta"+ str(i + 2)]) * 180 / np.pi - baseline)) > 180:
+        if max(abs(oRecord.channel("GEN:delta"+ str(i + 2)) * 180 / np.pi - baseline)) > 180:
             result = False
     oRecord.stability = result
     return result
@@ -109,34 +162,21 @@ if __name__ == "__main__":
     dynopt['fn'] = 60  # Nominal system frequency (Hz)
     dynopt['speed_volt'] = True  # Speed-voltage term option (for current injection calculation)
 
+    # Watchdog options (abort diverging runs)
+    dynopt['max_nonconv_steps'] = 20  # Consecutive time steps with non-converged network solutions
+    dynopt['max_omega_dev'] = 0.5  # Runaway machine speed deviation (pu)
+    dynopt['wall_budget'] = 600  # Wall-clock budget per run (s)
+
+    # Small-signal screening options (pre-fault eigenvalue check of the operating point)
+    dynopt['max_eig_real'] = 1e-5  # Largest eigenvalue real part of a stable operating point (1/s)
+    dynopt['min_damping'] = 0.01  # Damping ratio below which a mode is reported as poorly damped
+
     # Integrator option
     # dynopt['iopt'] = 'mod_euler'
     dynopt['iopt'] = 'runge_kutta'
 
-    # Create dynamic model objects
-    G1 = sym_order4('generator/G1.mach', dynopt)
-    G2 = sym_order4('generator/G2.mach', dynopt)
-    G3 = sym_order4('generator/G3.mach', dynopt)
-    G4 = sym_order4('generator/G4.mach', dynopt)
-    G5 = sym_order4('generator/G5.mach', dynopt)
-    G6 = sym_order4('generator/G6.mach', dynopt)
-    G7 = sym_order4('generator/G7.mach', dynopt)
-    G8 = sym_order4('generator/G8.mach', dynopt)
-    G9 = sym_order4('generator/G9.mach', dynopt)
-    G10 = sym_order4('generator/G10.mach', dynopt)
-
-    # Create dictionary of elements
-    elements = {}
-    elements[G1.id] = G1
-    elements[G2.id] = G2
-    elements[G3.id] = G3
-    elements[G4.id] = G4
-    elements[G5.id] = G5
-    elements[G6.id] = G6
-    elements[G7.id] = G7
-    elements[G8.id] = G8
-    elements[G9.id] = G9
-    elements[G10.id] = G10
+    # Create dynamic model objects (one row per machine in the fleet file)
+    elements = fleet('generator/fleet.csv').elements(dynopt)
 
     fault = {}
     fault['type'] = 'BRANCH_FAULT'
@@ -145,5 +185,15 @@ if __name__ == "__main__":
     fault['clear_time'] = 0.3
 
     case = loadcase('case39.py')
-    # transientSample(case, elements, dynopt, fault)
-    criticalSample(case, elements, dynopt, fault)
\ No newline at end of file
+
+    # Consolidated dataset store (read back with pydyn.dataset.dataset_reader)
+    store = dataset_store('critical sample')
+
+    # Plots are rendered to files by a background worker
+    renderer = plot_renderer()
+    # transientSample(case, elements, dynopt, fault, store, renderer)
+    criticalSample(case, elements, dynopt, fault, store, renderer)
+    renderer.close()
+
+    # Where the time went in all runs
+    print(merge_profiles(profiles).summary())
\ No newline at end of file
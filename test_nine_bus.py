@@ -103,5 +103,8 @@ if __name__ == '__main__':
     plt.ylabel('Rotor Angles ')
     plt.show()
     
+    # Plot branch flows
+    oRecord.plot_branch_flow('Qf')
+    
     # Write recorded variables to output file
     # oRecord.write_output('output.csv')
\ No newline at end of file
@@ -0,0 +1,84 @@
+#!python3
+#
+# Copyright (C) 2014-2015 Julius Susanto. All rights reserved.
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file.
+
+"""
+PYPOWER-Dynamics
+Streaming Recorder Test
+Streams more than chunk_size + window time steps of the nine-bus case and checks the streamed
+trajectories against a plain recorder run of the same case
+
+"""
+import os
+import tempfile
+
+# Dynamic model classes
+from pydyn.sym_order4 import sym_order4
+
+# Simulation modules
+from pydyn.events import events
+from pydyn.recorder import recorder, stream_recorder
+from pydyn.run_sim import run_sim
+
+# External modules
+from pypower.loadcase import loadcase
+import numpy as np
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def simulate(oRecord_factory):
+    ppc = loadcase(os.path.join(ROOT, 'case9.py'))
+
+    # Program options
+    dynopt = {}
+    dynopt['h'] = 1e-2
+    dynopt['t_sim'] = 1.5
+    dynopt['max_err'] = 1e-4
+    dynopt['max_iter'] = 100
+    dynopt['verbose'] = False
+    dynopt['fn'] = 60
+    dynopt['speed_volt'] = True
+    dynopt['iopt'] = 'runge_kutta'
+
+    elements = {}
+    for i in range(3):
+        G = sym_order4(os.path.join(ROOT, 'generator', 'G' + str(i + 1) + '.mach'), dynopt)
+        elements[G.id] = G
+
+    oEvents = events(os.path.join(ROOT, 'benchmarks', 'case9.evnt'))
+    oRecord = oRecord_factory(ppc)
+    run_sim(ppc, elements, dynopt, oEvents, oRecord)
+
+    return oRecord
+
+
+def test_stream_recorder():
+    chunk_size, window = 40, 25
+    rcd_file = os.path.join(ROOT, 'recorder.rcd')
+    reference = simulate(lambda ppc: recorder(rcd_file, ppc))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        stream_file = os.path.join(tmp, 'stream.bin')
+        streamed = simulate(lambda ppc: stream_recorder(rcd_file, ppc, stream_file, chunk_size, window))
+
+        # More steps than one chunk and the in-memory window
+        data = np.array(streamed.to_array())
+        assert data.shape[0] == len(reference.t_axis)
+        assert data.shape[0] > chunk_size + window
+        assert len(streamed.t_axis) == window
+
+        np.testing.assert_array_equal(data, reference.to_array())
+
+        # Complete trajectories of single channels (not only the in-memory window)
+        for name in ['time', 'GEN:delta2', 'BUS:U4']:
+            np.testing.assert_array_equal(streamed.channel(name), reference.channel(name))
+
+        del data
+
+
+if __name__ == '__main__':
+    test_stream_recorder()
+    print('stream_recorder: OK')